@@ -1,30 +1,29 @@
 from dingtalk_stream import AckMessage, ChatbotMessage, DingTalkStreamClient, Credential, ChatbotHandler, CallbackMessage
 from src.Agents import AgentClass
-from src.Storage import add_user
+from src.Storage import user_store, UserRecord
+from src.DingTalk import DingTalkClient
+from src.Logger import setup_logging, log_context, log_stage
+from src.Memory import start_session_archiver
 from dotenv import load_dotenv as _load_dotenv
 _load_dotenv()
-import os, shutil
+import os
+import asyncio
 import logging
+import requests
 
-##### 日志系统
-def setup_logging():
-    """设置日志配置"""
-    log_name = "MagicCat.log"
-    log_dir = "log"
-    log_path = os.path.join(log_dir, log_name)
-    shutil.rmtree(log_dir, ignore_errors=True)
-    if not os.path.exists(log_path):
-        os.makedirs(log_dir, exist_ok=True)
-
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler(log_path, encoding="utf-8"),
-        ]
-    )
-    return logging.getLogger(log_name)
+logger = logging.getLogger("MagicCat")
+
+
+def register_user(staff_id: str, nick: str = None):
+    """首次出现的用户查询真实 unionId 后写入用户表，建立 staffId -> unionId 索引"""
+    if user_store.get_by_staff_id(staff_id) is not None:
+        return
+    try:
+        union_id = DingTalkClient().get_union_id(staff_id)
+    except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
+        logger.warning(f"查询用户 {staff_id} 的 unionId 失败: {e}")
+        return
+    user_store.put(UserRecord(union_id, staff_id=staff_id, nick=nick))
 
 
 class EchoTextHandler(ChatbotHandler):
@@ -39,29 +38,33 @@ class EchoTextHandler(ChatbotHandler):
         Returns:
             状态码和状态消息
         """
-        logger = setup_logging()
-
-        # 从回调数据中获取聊天消息
-        incoming_message = ChatbotMessage.from_dict(callback.data)
-        logger.info(incoming_message)
-        logger.info(callback.data)
-
-        # 提取消息文本内容并去掉前后空白
-        text = incoming_message.text.content.strip()
-
         # 获取发送者的用户ID
-        userid = callback.data['senderStaffId']
-
-        # 将用户添加到存储中
-        add_user("userid", userid)
-
-        # # 使用代理处理用户消息
-        # msg = AgentClass().run_agent(text)
-        # logger.info(msg)
-
-        # # 回复处理后的消息
-        # self.reply_text(msg['output'], incoming_message)
-        self.reply_text("你说的是" + text, incoming_message)
+        userid = callback.data.get('senderStaffId')
+
+        with log_context(session_id=userid, message_id=callback.data.get('msgId')):
+            # 从回调数据中获取聊天消息
+            with log_stage("parse"):
+                incoming_message = ChatbotMessage.from_dict(callback.data)
+                # 提取消息文本内容并去掉前后空白
+                text = incoming_message.text.content.strip()
+            logger.info(incoming_message)
+            logger.info(callback.data)
+
+            # 将用户添加到存储中（按 staffId 索引，已存在的用户不重复写入）；
+            # 用户表和钉钉接口都是同步调用，放到线程中执行，不阻塞事件循环
+            if userid:
+                await asyncio.to_thread(register_user, userid, callback.data.get('senderNick'))
+
+            # # 使用代理处理用户消息
+            # with log_stage("agent"):
+            #     msg = AgentClass().run_agent(text)
+            # logger.info(msg)
+
+            # # 回复处理后的消息
+            # self.reply_text(msg['output'], incoming_message)
+            with log_stage("reply"):
+                self.reply_text("你说的是" + text, incoming_message)
+            logger.info(f"已回复: {text}")
 
         return AckMessage.STATUS_OK, 'OK'
     
@@ -85,6 +88,9 @@ def main():
         client.register_callback_handler(ChatbotMessage.TOPIC, EchoTextHandler())
         logger.info("已注册ChatbotMessage的回调处理器")
 
+        # 定期把空闲会话归档到本地磁盘
+        start_session_archiver()
+
         # 启动客户端
         logger.info("正在启动钉钉客户端...")
         client.start_forever()
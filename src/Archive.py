@@ -0,0 +1,81 @@
+import os
+import time
+import struct
+import sqlite3
+import threading
+from typing import Optional
+
+# 冷会话归档库路径
+ARCHIVE_PATH = os.getenv("SESSION_ARCHIVE_PATH", os.path.join("data", "sessions.db"))
+
+
+def pack_items(items: list) -> bytes:
+    """把 Redis 列表中的原始消息按 [4字节长度][数据] 依次拼接"""
+    return b"".join(struct.pack(">I", len(item)) + item for item in items)
+
+def unpack_items(blob: bytes) -> list:
+    items, pos = [], 0
+    while pos < len(blob):
+        (length,) = struct.unpack_from(">I", blob, pos)
+        pos += 4
+        items.append(blob[pos:pos + length])
+        pos += length
+    return items
+
+
+class SessionArchive:
+    """本地 SQLite 冷会话存储：保存 Redis 中过期前的会话，用户回来时再恢复"""
+    def __init__(self, path: str = ARCHIVE_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, items BLOB NOT NULL, summary TEXT, "
+                "token_total INTEGER, archived_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite 连接不能跨线程共享，每个线程各自持有一个
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, session_id: str, items: list, summary: Optional[str], token_total: Optional[int]):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                (session_id, pack_items(items), summary, token_total, time.time()),
+            )
+
+    def get(self, session_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT items, summary, token_total FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"items": unpack_items(row[0]), "summary": row[1], "token_total": row[2]}
+
+    def delete(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_session_archive() -> SessionArchive:
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = SessionArchive()
+        return _archive
@@ -0,0 +1,269 @@
+import os
+import copy
+import time
+import asyncio
+import bisect
+import threading
+import httpx
+import requests
+from typing import List, Optional
+from src.Matcher import event_window, parse_time
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# 本地日程镜像：距上次同步不超过 CALENDAR_STALENESS 秒时直接用本地数据回答
+CALENDAR_STALENESS = int(os.getenv("CALENDAR_STALENESS", "60"))
+CALENDAR_PAGE_SIZE = int(os.getenv("CALENDAR_PAGE_SIZE", "100"))
+
+
+def _invalid_sync_token(e: Exception) -> bool:
+    """syncToken 过期或无效时钉钉返回 410，或 400 且错误信息指向 syncToken"""
+    response = getattr(e, "response", None)
+    if response is None:
+        return False
+    return response.status_code == 410 or (response.status_code == 400 and "synctoken" in (response.text or "").lower())
+
+
+class IntervalIndex:
+    """按开始时间排序的区间索引：重叠查询只需二分到 [a - 最长时长, b) 的开始时间范围内逐个检查"""
+    def __init__(self):
+        self._starts = []
+        self._items = []
+        self._max_duration = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, start: float, end: float, key: str):
+        position = bisect.bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._items.insert(position, (start, end, key))
+        self._max_duration = max(self._max_duration, end - start)
+
+    def remove(self, start: float, end: float, key: str):
+        position = bisect.bisect_left(self._starts, start)
+        while position < len(self._items) and self._starts[position] == start:
+            if self._items[position][2] == key:
+                del self._starts[position]
+                del self._items[position]
+                return
+            position += 1
+
+    def overlapping(self, start: float, end: float) -> List[str]:
+        """与 [start, end) 重叠的区间；start == end 时查询包含该时间点的区间"""
+        low = bisect.bisect_left(self._starts, start - self._max_duration)
+        high = bisect.bisect_right(self._starts, end) if start == end else bisect.bisect_left(self._starts, end)
+        return [
+            key for item_start, item_end, key in self._items[low:high]
+            if item_end > start or (item_start == item_end == start)
+        ]
+
+    def starting_between(self, start: float = None, end: float = None) -> List[str]:
+        low = 0 if start is None else bisect.bisect_left(self._starts, start)
+        high = len(self._starts) if end is None else bisect.bisect_right(self._starts, end)
+        return [key for _, _, key in self._items[low:high]]
+
+
+class CalendarMirror:
+    """单个用户主日历的本地镜像：用 syncToken 增量同步，写操作成功后立即写入本地
+    列表接口返回的是周期日程的主日程而不是展开后的实例，所以镜像只用于查找日程，冲突检查仍以忙闲接口为准；
+    镜像中有周期日程时，按时间范围的查询改用接口（带 timeMin/timeMax 时接口会展开周期日程的实例）。
+    """
+    def __init__(self, union_id: str, staleness: int = CALENDAR_STALENESS):
+        self.union_id = union_id
+        self.staleness = staleness
+        self.sync_token = None
+        self.synced_at = 0.0
+        self._events = {}
+        self._windows = {}
+        self._index = IntervalIndex()
+        self._recurring = set()
+        self._lock = threading.Lock()
+        # 同一时间只有一个同步在进行，避免并发全量拉取互相覆盖 syncToken
+        self._sync_lock = threading.Lock()
+        self._async_sync_lock = None
+        self._async_loop = None
+
+    @property
+    def path(self) -> str:
+        return f"/v1.0/calendar/users/{self.union_id}/calendars/primary/events"
+
+    def is_fresh(self) -> bool:
+        return self.sync_token is not None and time.time() - self.synced_at < self.staleness
+
+    def __len__(self):
+        return len(self._events)
+
+    def _upsert(self, event: dict):
+        self._remove(event["id"])
+        start, end = event_window(event)
+        if start is None:
+            return
+        self._events[event["id"]] = event
+        self._windows[event["id"]] = (start, end)
+        self._index.add(start, end, event["id"])
+        if event.get("recurrence"):
+            self._recurring.add(event["id"])
+
+    def _remove(self, event_id: str):
+        self._recurring.discard(event_id)
+        if self._events.pop(event_id, None) is not None:
+            start, end = self._windows.pop(event_id)
+            self._index.remove(start, end, event_id)
+
+    def upsert(self, event: dict):
+        if event and event.get("id"):
+            with self._lock:
+                if event.get("status") == "cancelled":
+                    self._remove(event["id"])
+                else:
+                    self._upsert(copy.deepcopy(event))
+
+    def update(self, event_id: str, changes: dict):
+        """修改成功后把改动合并进本地副本，接口只返回部分字段时也不会丢失原有时间"""
+        with self._lock:
+            event = copy.deepcopy({**self._events.get(event_id, {}), **changes, "id": event_id})
+            self._upsert(event)
+
+    def remove(self, event_id: str):
+        with self._lock:
+            self._remove(event_id)
+
+    def _params(self, next_token: Optional[str]) -> dict:
+        params = {"maxResults": CALENDAR_PAGE_SIZE}
+        if self.sync_token:
+            # 增量同步需要带上已删除的日程，才能把它们从镜像中移除
+            params.update(syncToken=self.sync_token, showDeleted="true")
+        if next_token:
+            params["nextToken"] = next_token
+        return params
+
+    def _apply(self, pages: List[dict], full: bool):
+        with self._lock:
+            if full:
+                self._events, self._windows, self._index, self._recurring = {}, {}, IntervalIndex(), set()
+            for page in pages:
+                for event in page.get("events", []):
+                    if event.get("status") == "cancelled":
+                        self._remove(event["id"])
+                    else:
+                        self._upsert(event)
+            self.sync_token = pages[-1].get("syncToken") or self.sync_token or ""
+            self.synced_at = time.time()
+
+    def sync(self, client, force: bool = False):
+        """过期时拉取自上次同步以来的变更；syncToken 失效时退回全量同步"""
+        if self.is_fresh() and not force:
+            return
+        synced_at = self.synced_at
+        with self._sync_lock:
+            # 等锁期间其他调用方已经同步过，直接使用其结果
+            if self.synced_at != synced_at:
+                return
+            try:
+                self._apply(self._fetch(client), full=not self.sync_token)
+            except requests.exceptions.HTTPError as e:
+                if not self.sync_token or not _invalid_sync_token(e):
+                    raise
+                self.sync_token = None
+                self._apply(self._fetch(client), full=True)
+
+    def _fetch(self, client) -> List[dict]:
+        pages, next_token = [], None
+        while True:
+            response = client.request("GET", self.path, params=self._params(next_token))
+            pages.append(response.json())
+            next_token = pages[-1].get("nextToken")
+            if not next_token:
+                return pages
+
+    def _get_async_sync_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_loop = loop
+            self._async_sync_lock = asyncio.Lock()
+        return self._async_sync_lock
+
+    async def async_sync(self, client, force: bool = False):
+        if self.is_fresh() and not force:
+            return
+        synced_at = self.synced_at
+        async with self._get_async_sync_lock():
+            if self.synced_at != synced_at:
+                return
+            try:
+                self._apply(await self._afetch(client), full=not self.sync_token)
+            except httpx.HTTPStatusError as e:
+                if not self.sync_token or not _invalid_sync_token(e):
+                    raise
+                self.sync_token = None
+                self._apply(await self._afetch(client), full=True)
+
+    async def _afetch(self, client) -> List[dict]:
+        pages, next_token = [], None
+        while True:
+            response = await client.request("GET", self.path, params=self._params(next_token))
+            pages.append(response.json())
+            next_token = pages[-1].get("nextToken")
+            if not next_token:
+                return pages
+
+    def covers(self, time_min: str = None, time_max: str = None) -> bool:
+        """镜像能否回答这次查询：按时间范围查询且镜像中有周期日程时不能"""
+        with self._lock:
+            return not (time_min or time_max) or not self._recurring
+
+    def _range_params(self, time_min: Optional[str], time_max: Optional[str], next_token: Optional[str]) -> dict:
+        params = {"maxResults": CALENDAR_PAGE_SIZE}
+        if time_min:
+            params["timeMin"] = time_min
+        if time_max:
+            params["timeMax"] = time_max
+        if next_token:
+            params["nextToken"] = next_token
+        return params
+
+    def fetch_range(self, client, time_min: str = None, time_max: str = None) -> List[dict]:
+        """直接按时间范围查询接口，结果包含展开后的周期日程实例，不写入镜像"""
+        events, next_token = [], None
+        while True:
+            page = client.request("GET", self.path, params=self._range_params(time_min, time_max, next_token)).json()
+            events.extend(page.get("events", []))
+            next_token = page.get("nextToken")
+            if not next_token:
+                return events
+
+    async def afetch_range(self, client, time_min: str = None, time_max: str = None) -> List[dict]:
+        events, next_token = [], None
+        while True:
+            response = await client.request("GET", self.path, params=self._range_params(time_min, time_max, next_token))
+            page = response.json()
+            events.extend(page.get("events", []))
+            next_token = page.get("nextToken")
+            if not next_token:
+                return events
+
+    def search(self, time_min: str = None, time_max: str = None) -> List[dict]:
+        """按开始时间范围查询，与钉钉 timeMin/timeMax 语义一致；返回副本，调用方修改不会影响镜像"""
+        start = parse_time({"dateTime": time_min}) if time_min else None
+        end = parse_time({"dateTime": time_max}) if time_max else None
+        with self._lock:
+            return [copy.deepcopy(self._events[key]) for key in self._index.starting_between(start, end)]
+
+    def overlapping(self, start: str, end: str) -> List[dict]:
+        start_ts, end_ts = parse_time({"dateTime": start}), parse_time({"dateTime": end})
+        if start_ts is None or end_ts is None:
+            raise ValueError(f"无法解析时间范围：{start} ~ {end}")
+        with self._lock:
+            return [copy.deepcopy(self._events[key]) for key in self._index.overlapping(start_ts, end_ts)]
+
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+def get_calendar_mirror(union_id: str) -> CalendarMirror:
+    with _mirrors_lock:
+        mirror = _mirrors.get(union_id)
+        if mirror is None:
+            mirror = _mirrors[union_id] = CalendarMirror(union_id)
+        return mirror
@@ -0,0 +1,111 @@
+import os
+import json
+import zlib
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+##### 会话消息的紧凑二进制编码
+# 格式: [标志字节][正文]，正文可选 zlib 压缩
+#   正文 = [类型码][varint(token数+1)][varint(内容长度)][内容 utf-8][其余非空字段的紧凑 JSON]
+# 以 "{" 开头的旧数据按 langchain 的 JSON 格式读取
+FORMAT_VERSION = 0x01
+FLAG_COMPRESSED = 0x80
+MEMORY_COMPRESSION = os.getenv("MEMORY_COMPRESSION", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.getenv("MEMORY_COMPRESS_MIN_BYTES", "200"))
+
+TYPE_CODES = {"human": 1, "ai": 2, "system": 3, "tool": 4, "function": 5, "chat": 6}
+CODE_TYPES = {code: name for name, code in TYPE_CODES.items()}
+
+
+def _write_varint(value: int, out: bytearray):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+def _read_varint(data: bytes, pos: int) -> tuple:
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _is_default(value) -> bool:
+    """None、False 和空字符串/容器是可以省略的默认值；0 和 0.0 不是"""
+    return value is None or value is False or (isinstance(value, (str, dict, list)) and not value)
+
+
+def encode_record(record: dict, compress: bool = MEMORY_COMPRESSION) -> bytes:
+    """把 message_to_dict 的结果编码为紧凑二进制"""
+    message_type = record["type"]
+    data = dict(record["data"])
+    data.pop("type", None)
+    content = data.pop("content", "")
+    metadata = dict(data.pop("response_metadata", None) or {})
+    token_count = metadata.pop("token_count", None)
+
+    # 只保留非默认值的字段
+    extras = {k: v for k, v in data.items() if not _is_default(v)}
+    if metadata:
+        extras["response_metadata"] = metadata
+    if not isinstance(content, str):
+        extras["content"] = content
+        content = ""
+    code = TYPE_CODES.get(message_type, 0)
+    if code == 0:
+        extras["type"] = message_type
+
+    body = bytearray([code])
+    _write_varint(0 if token_count is None else token_count + 1, body)
+    content_bytes = content.encode("utf-8")
+    _write_varint(len(content_bytes), body)
+    body += content_bytes
+    if extras:
+        body += json.dumps(extras, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    flags = FORMAT_VERSION
+    if compress and len(body) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(bytes(body), 6)
+        if len(compressed) < len(body):
+            return bytes([flags | FLAG_COMPRESSED]) + compressed
+    return bytes([flags]) + bytes(body)
+
+
+def decode_record(raw: bytes) -> dict:
+    """解码为 message_to_dict 格式，兼容旧的 JSON 数据"""
+    if raw[:1] == b"{":
+        return json.loads(raw.decode("utf-8"))
+    flags = raw[0]
+    if flags & 0x7F != FORMAT_VERSION:
+        raise ValueError(f"未知的消息编码版本: {flags}")
+    body = zlib.decompress(raw[1:]) if flags & FLAG_COMPRESSED else raw[1:]
+
+    code = body[0]
+    token_count, pos = _read_varint(body, 1)
+    length, pos = _read_varint(body, pos)
+    content = body[pos:pos + length].decode("utf-8")
+    pos += length
+    extras = json.loads(body[pos:].decode("utf-8")) if pos < len(body) else {}
+
+    message_type = extras.pop("type", None) or CODE_TYPES[code]
+    data = {"content": extras.pop("content", content)}
+    metadata = extras.pop("response_metadata", {})
+    if token_count:
+        metadata["token_count"] = token_count - 1
+    data["response_metadata"] = metadata
+    data.update(extras)
+    return {"type": message_type, "data": data}
+
+
+def encode_message(message: BaseMessage, compress: bool = MEMORY_COMPRESSION) -> bytes:
+    return encode_record(message_to_dict(message), compress=compress)
+
+def decode_messages(items: list) -> list:
+    return messages_from_dict([decode_record(item) for item in items])
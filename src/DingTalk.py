@@ -0,0 +1,292 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+DINGTALK_API = "https://api.dingtalk.com"
+DINGTALK_OAPI = "https://oapi.dingtalk.com"
+# 令牌在过期前多少秒就刷新
+TOKEN_REFRESH_MARGIN = int(os.getenv("DINGDING_TOKEN_MARGIN", "300"))
+# 共享连接池大小 / 单次请求超时(秒)
+HTTP_POOL_SIZE = int(os.getenv("DINGDING_POOL_SIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("DINGDING_TIMEOUT", "10"))
+# 异步客户端同时在途的最大请求数
+MAX_CONCURRENCY = int(os.getenv("DINGDING_MAX_CONCURRENCY", "10"))
+# 批量操作：每秒最多请求数 / 令牌桶容量 / 被限流时的最大重试次数 / 退避基数(秒)
+DINGTALK_QPS = float(os.getenv("DINGDING_QPS", "15"))
+DINGTALK_BURST = int(os.getenv("DINGDING_BURST", "15"))
+BATCH_MAX_RETRIES = int(os.getenv("DINGDING_BATCH_RETRIES", "3"))
+BATCH_BACKOFF = float(os.getenv("DINGDING_BATCH_BACKOFF", "0.5"))
+
+##### 进程级共享的 HTTP 会话（keep-alive 连接池）
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+http_session = _build_session()
+
+
+##### 异步连接池：每个事件循环各自持有 httpx.AsyncClient 和并发信号量
+class AsyncPool:
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, max_concurrency: int = MAX_CONCURRENCY, timeout: float = HTTP_TIMEOUT):
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        # 不会在新循环里复用旧循环的连接；循环退出时关闭其客户端，循环被回收后条目随之释放
+        self._pools = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _ensure(self) -> tuple:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                client = httpx.AsyncClient(
+                    base_url=DINGTALK_API,
+                    headers={"Content-Type": "application/json"},
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                )
+                closer = self._closer(client)
+                # 事件循环退出前（asyncio.run 会调用 shutdown_asyncgens）关闭该循环的客户端
+                asyncio.ensure_future(closer.asend(None))
+                pool = self._pools[loop] = (client, asyncio.Semaphore(self.max_concurrency), closer)
+            return pool
+
+    async def _closer(self, client: httpx.AsyncClient):
+        try:
+            yield
+        finally:
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                # aclose 之后当前循环可能已经换了新的客户端，只移除自己的条目
+                pool = self._pools.get(loop)
+                if pool is not None and pool[0] is client:
+                    del self._pools[loop]
+            await client.aclose()
+
+    def client(self) -> httpx.AsyncClient:
+        return self._ensure()[0]
+
+    def semaphore(self) -> asyncio.Semaphore:
+        return self._ensure()[1]
+
+    async def aclose(self):
+        """关闭当前事件循环的连接池"""
+        with self._lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool[0].aclose()
+
+async_pool = AsyncPool()
+
+
+class TokenManager:
+    """缓存钉钉访问令牌，过期前统一刷新，并发请求只刷新一次"""
+    def __init__(self, app_key: str, app_secret: str, margin: int = TOKEN_REFRESH_MARGIN):
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.margin = margin
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._async_lock = None
+        self._async_loop = None
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at - self.margin
+
+    def _store(self, data: dict) -> str:
+        token = data.get("accessToken")
+        if not token:
+            raise ValueError("获取钉钉访问令牌失败")
+        self._token = token
+        self._expires_at = time.monotonic() + int(data.get("expireIn", 7200))
+        return token
+
+    def get_token(self) -> str:
+        if self._is_valid():
+            return self._token
+        with self._lock:
+            # 双重检查：等锁期间可能已被其他线程刷新
+            if self._is_valid():
+                return self._token
+            try:
+                response = http_session.post(
+                    f"{DINGTALK_API}/v1.0/oauth2/accessToken",
+                    json={"appKey": self.app_key, "appSecret": self.app_secret},
+                    timeout=HTTP_TIMEOUT
+                )
+                response.raise_for_status()
+                return self._store(response.json())
+            except requests.exceptions.RequestException as e:
+                raise RuntimeError(f"获取访问令牌失败: {str(e)}")
+
+    def _get_async_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_loop = loop
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+    async def aget_token(self) -> str:
+        if self._is_valid():
+            return self._token
+        async with self._get_async_lock():
+            if self._is_valid():
+                return self._token
+            try:
+                response = await async_pool.client().post(
+                    "/v1.0/oauth2/accessToken",
+                    json={"appKey": self.app_key, "appSecret": self.app_secret}
+                )
+                response.raise_for_status()
+                return self._store(response.json())
+            except httpx.HTTPError as e:
+                raise RuntimeError(f"获取访问令牌失败: {str(e)}")
+
+    def invalidate(self):
+        self._token = None
+        self._expires_at = 0.0
+
+
+_token_managers = {}
+_token_managers_lock = threading.Lock()
+
+def get_token_manager(app_key: str, app_secret: str) -> TokenManager:
+    key = (app_key, app_secret)
+    with _token_managers_lock:
+        if key not in _token_managers:
+            _token_managers[key] = TokenManager(app_key, app_secret)
+        return _token_managers[key]
+
+
+# DingTalk API 客户端
+class DingTalkClient:
+    def __init__(self):
+        self.app_key = os.getenv("DINGDING_ID")
+        self.app_secret = os.getenv("DINGDING_SECRET")
+        self.union_id = os.getenv("DINGDING_UNION_ID")
+
+    def _token_manager(self) -> TokenManager:
+        if not all([self.app_key, self.app_secret, self.union_id]):
+            raise ValueError("钉钉配置信息不完整")
+        return get_token_manager(self.app_key, self.app_secret)
+
+    def get_access_token(self) -> str:
+        return self._token_manager().get_token()
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """通过共享连接池调用钉钉接口，令牌失效时刷新后重试一次"""
+        manager = self._token_manager()
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        headers = kwargs.pop("headers", {})
+        for attempt in range(2):
+            headers["x-acs-dingtalk-access-token"] = manager.get_token()
+            response = http_session.request(method, f"{DINGTALK_API}{path}", headers=headers, **kwargs)
+            if response.status_code == 401 and attempt == 0:
+                manager.invalidate()
+                continue
+            break
+        response.raise_for_status()
+        return response
+
+    def get_union_id(self, staff_id: str) -> str:
+        """根据 staffId(userid) 查询用户的 unionId"""
+        response = http_session.post(
+            f"{DINGTALK_OAPI}/topapi/v2/user/get",
+            params={"access_token": self.get_access_token()},
+            json={"userid": staff_id},
+            timeout=HTTP_TIMEOUT
+        )
+        response.raise_for_status()
+        data = response.json()
+        union_id = (data.get("result") or {}).get("unionid")
+        if data.get("errcode") or not union_id:
+            raise RuntimeError(f"查询 unionId 失败: {data.get('errmsg')}")
+        return union_id
+
+
+# DingTalk API 异步客户端，供钉钉 Stream 事件循环中的工具调用
+class AsyncDingTalkClient(DingTalkClient):
+    async def aget_access_token(self) -> str:
+        return await self._token_manager().aget_token()
+
+    async def request(self, method: str, path: str, timeout: float = None, **kwargs) -> httpx.Response:
+        """异步调用钉钉接口：受全局并发上限约束，每次调用单独超时"""
+        manager = self._token_manager()
+        headers = kwargs.pop("headers", {})
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        async with async_pool.semaphore():
+            for attempt in range(2):
+                headers["x-acs-dingtalk-access-token"] = await manager.aget_token()
+                response = await async_pool.client().request(method, path, headers=headers, **kwargs)
+                if response.status_code == 401 and attempt == 0:
+                    manager.invalidate()
+                    continue
+                break
+        response.raise_for_status()
+        return response
+
+
+##### 批量调用：共享令牌桶限速，被限流的项指数退避后重试
+dingtalk_rate_limiter = InMemoryRateLimiter(
+    requests_per_second=DINGTALK_QPS,
+    check_every_n_seconds=0.05,
+    max_bucket_size=DINGTALK_BURST,
+)
+
+def is_throttled(e: Exception) -> bool:
+    """钉钉限流时返回 429，或 403 且错误码为 QpsLimit 系列"""
+    response = getattr(e, "response", None)
+    if response is None:
+        return False
+    return response.status_code == 429 or "QpsLimit" in (response.text or "")
+
+def _backoff(attempt: int) -> float:
+    return BATCH_BACKOFF * (2 ** attempt) + random.uniform(0, BATCH_BACKOFF)
+
+def run_rate_limited(items: list, call, max_workers: int = MAX_CONCURRENCY) -> list:
+    """并发执行 call(item)，返回与 items 一一对应的 (是否成功, 结果或异常)"""
+    def run(item):
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            dingtalk_rate_limiter.acquire()
+            try:
+                return True, call(item)
+            except Exception as e:
+                if not is_throttled(e) or attempt == BATCH_MAX_RETRIES:
+                    return False, e
+                time.sleep(_backoff(attempt))
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(run, items))
+
+async def arun_rate_limited(items: list, call) -> list:
+    """异步版本，并发数受 async_pool 的信号量约束"""
+    async def run(item):
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            await dingtalk_rate_limiter.aacquire()
+            try:
+                return True, await call(item)
+            except Exception as e:
+                if not is_throttled(e) or attempt == BATCH_MAX_RETRIES:
+                    return False, e
+                await asyncio.sleep(_backoff(attempt))
+
+    return list(await asyncio.gather(*(run(item) for item in items)))
@@ -1,11 +1,103 @@
+import os
+import re
+import threading
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableLambda
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from src.Models import get_chat_model
 from dotenv import load_dotenv as _load_dotenv
 _load_dotenv()
 
+# 本地快速分类的置信度阈值，低于阈值的输入交给 LLM 判断
+EMOTION_FAST_THRESHOLD = float(os.getenv("EMOTION_FAST_THRESHOLD", "0.8"))
+# 批量分析时每秒最多发起的 LLM 请求数
+EMOTION_BATCH_RPS = float(os.getenv("EMOTION_BATCH_RPS", "10"))
+
+##### 本地情绪词典：情绪类型 -> (关键词, 负面评分)
+EMOTION_LEXICON = {
+    "friendly": (["谢谢", "感谢", "多谢", "辛苦了", "麻烦你", "您好", "你好", "请问", "thanks", "thank you"], "1"),
+    "cheerful": (["哈哈", "嘿嘿", "开心", "高兴", "太好了", "真好", "好开心", "好棒"], "2"),
+    "upbeat": (["太棒了", "加油", "冲冲冲", "干劲", "充满活力", "元气满满"], "1"),
+    "angry": (["生气", "气死", "愤怒", "投诉", "退款", "垃圾", "骗子", "维权", "滚", "什么破", "有病"], "8"),
+    "depressed": (["难过", "伤心", "沮丧", "郁闷", "想哭", "失望", "绝望", "心累", "崩溃"], "9"),
+}
+# 整句就是简单应答时直接判为中性
+NEUTRAL_REPLIES = {"好", "好的", "嗯", "嗯嗯", "哦", "收到", "知道了", "明白", "明白了", "行", "可以", "ok", "okay", "是的", "对"}
+# 容易误匹配的短词（“滚动”里的“滚”、“你好烦”里的“你好”），必须单独成句才算命中
+STANDALONE_KEYWORDS = {"滚", "你好", "您好"}
+NEGATIONS = ("不", "没", "别", "未", "无")
+# 关键词基本占满整个短句（最多多出 WHOLE_CLAUSE_EXTRA 个字，如“谢谢你”“好生气”）时直接采用本地结果
+WHOLE_CLAUSE_EXTRA = 2
+_PUNCTUATION = re.compile(r"[，。！？、,.!?~～…]+")
+
+
+class LexiconEmotionClassifier:
+    """基于关键词的本地情绪分类，返回 ({"feeling", "score"}, 置信度)"""
+    def __init__(self, lexicon: dict = EMOTION_LEXICON, neutral_replies: set = NEUTRAL_REPLIES):
+        self.lexicon = lexicon
+        self.neutral_replies = neutral_replies
+
+    def classify(self, text: str):
+        # 按标点切成短句，否定词和单独成句的判断都以短句为单位
+        # 短句内的连续空白合并为一个空格，“thank you” 这类英文关键词才能匹配
+        clauses = [" ".join(clause.split()) for clause in _PUNCTUATION.split(text.strip().lower())]
+        clauses = [clause for clause in clauses if clause]
+        normalized = "".join(clauses)
+        if not normalized:
+            return None, 0.0
+        if normalized in self.neutral_replies:
+            return {"feeling": "default", "score": "5"}, 1.0
+
+        hits, whole = {}, False
+        for clause in clauses:
+            for feeling, (keywords, _) in self.lexicon.items():
+                for keyword in keywords:
+                    if keyword in STANDALONE_KEYWORDS:
+                        if clause == keyword:
+                            hits[feeling] = hits.get(feeling, 0) + 1
+                            whole = True
+                        continue
+                    index = clause.find(keyword)
+                    if index < 0:
+                        continue
+                    # 同一短句中情绪词前面出现否定词（如“不开心”“没有生气”“别再生气”）交给 LLM 判断
+                    if any(negation in clause[:index] for negation in NEGATIONS):
+                        return None, 0.0
+                    hits[feeling] = hits.get(feeling, 0) + 1
+                    whole = whole or len(clause) <= len(keyword) + WHOLE_CLAUSE_EXTRA
+
+        if len(hits) != 1:
+            return None, 0.0
+        feeling, count = next(iter(hits.items()))
+        # 关键词只是长句中的一部分时，命中一处的置信度低于默认阈值，至少两处命中才直接采用本地结果；
+        # 关键词就是整个短句（“谢谢”“滚！”）时足以直接判断
+        confidence = min(1.0, 0.5 + 0.2 * count)
+        if whole:
+            confidence = max(confidence, 0.9)
+        # 句子越长，关键词越不能代表整体情绪
+        if len(normalized) > 20:
+            confidence *= 0.8
+        return {"feeling": feeling, "score": self.lexicon[feeling][1]}, confidence
+
+
+##### 各层分类器的命中计数
+emotion_stats = {"local": 0, "llm": 0}
+_emotion_stats_lock = threading.Lock()
+
+def _count(tier: str):
+    with _emotion_stats_lock:
+        emotion_stats[tier] += 1
+
+def get_emotion_stats() -> dict:
+    with _emotion_stats_lock:
+        return dict(emotion_stats)
+
+
 class EmotionClass:
-    def __init__(self):
-        self.chat_model = ChatOpenAI()
+    def __init__(self, threshold: float = EMOTION_FAST_THRESHOLD):
+        self.threshold = threshold
+        self.fast_classifier = LexiconEmotionClassifier()
+        self.chat_model = get_chat_model()
         # 结构化输出
         self.json_schema = {
             "title": "emotions",
@@ -84,8 +176,16 @@ class EmotionClass:
             if not input.strip():
                 return None
 
+            # 先走本地词典，置信度足够时不再调用 LLM
+            result, confidence = self.fast_classifier.classify(input)
+            if result is not None and confidence >= self.threshold:
+                _count("local")
+                self.Emotion = result
+                return result
+
             if self.chain is not None:
                 result = self.chain.invoke({"input": input})
+                _count("llm")
             else:
                 raise ValueError("EmotionChain is not properly instantiated.")
 
@@ -93,3 +193,52 @@ class EmotionClass:
             return result
         except Exception as e:
             return None
+
+    def emotion_sensing_batch(self, texts: list, max_concurrency: int = 8, requests_per_second: float = EMOTION_BATCH_RPS) -> list:
+        """批量情绪分析
+        相同输入只分析一次，LLM 请求并发执行并限速，结果顺序与输入一致。
+        Returns:
+            list: 每项为 {"input", "emotion", "error"}，失败项 emotion 为 None 并带上错误信息
+        """
+        # 非字符串输入统一转成字符串，None 视为空输入；去重后保持首次出现的顺序
+        normalized = ["" if text is None else text if isinstance(text, str) else str(text) for text in texts]
+        outcomes = {}
+        pending = []
+        for text in dict.fromkeys(normalized):
+            if not text.strip():
+                outcomes[text] = (None, "输入为空")
+                continue
+            result, confidence = self.fast_classifier.classify(text)
+            if result is not None and confidence >= self.threshold:
+                _count("local")
+                outcomes[text] = (result, None)
+            else:
+                pending.append(text)
+
+        if pending:
+            limiter = InMemoryRateLimiter(
+                requests_per_second=requests_per_second,
+                check_every_n_seconds=0.05,
+                max_bucket_size=max_concurrency,
+            )
+
+            def _invoke(text):
+                limiter.acquire()
+                return self.chain.invoke({"input": text})
+
+            results = RunnableLambda(_invoke).batch(
+                pending,
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            for text, result in zip(pending, results):
+                if isinstance(result, Exception):
+                    outcomes[text] = (None, f"{type(result).__name__}: {result}")
+                else:
+                    _count("llm")
+                    outcomes[text] = (result, None)
+
+        return [
+            {"input": text, "emotion": outcomes[key][0], "error": outcomes[key][1]}
+            for text, key in zip(texts, normalized)
+        ]
@@ -0,0 +1,87 @@
+import os
+import time
+import queue
+import threading
+from typing import List
+from qdrant_client.http import models
+from src.VectorStore import get_vector_store
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+EPISODIC_COLLECTION = os.getenv("EPISODIC_COLLECTION", "episodic_memory")
+# 每轮召回的历史片段数 / 最低相似度
+EPISODIC_TOP_K = int(os.getenv("EPISODIC_TOP_K", "3"))
+EPISODIC_SCORE_THRESHOLD = float(os.getenv("EPISODIC_SCORE_THRESHOLD", "0.75"))
+# 后台批量写入：攒够 EPISODIC_BATCH_SIZE 条或等待 EPISODIC_FLUSH_SECONDS 秒后统一向量化
+EPISODIC_BATCH_SIZE = int(os.getenv("EPISODIC_BATCH_SIZE", "32"))
+EPISODIC_FLUSH_SECONDS = float(os.getenv("EPISODIC_FLUSH_SECONDS", "2"))
+
+
+class EpisodicMemory:
+    """长期情景记忆：把每轮对话向量化存入 Qdrant，按当前输入召回最相关的 top-k 片段"""
+    def __init__(self, collection_name: str = EPISODIC_COLLECTION, top_k: int = EPISODIC_TOP_K,
+                 score_threshold: float = EPISODIC_SCORE_THRESHOLD, store=None,
+                 batch_size: int = EPISODIC_BATCH_SIZE, flush_seconds: float = EPISODIC_FLUSH_SECONDS):
+        self.collection_name = collection_name
+        self.top_k = top_k
+        self.score_threshold = score_threshold
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._store = store
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="episodic-writer", daemon=True)
+        self._worker.start()
+
+    @property
+    def store(self):
+        if self._store is not None:
+            return self._store
+        return get_vector_store(self.collection_name)
+
+    def remember(self, session_id: str, user_input: str, output: str):
+        """回复发出后调用：只入队，不阻塞当前对话"""
+        if user_input or output:
+            self._queue.put((session_id, f"user: {user_input}\n魔法猫猫: {output}", time.time()))
+
+    def recall(self, session_id: str, query: str) -> List[str]:
+        try:
+            session_filter = models.Filter(must=[
+                models.FieldCondition(key="metadata.session_id", match=models.MatchValue(value=session_id))
+            ])
+            results = self.store.similarity_search_with_score(query, k=self.top_k, filter=session_filter)
+            return [doc.page_content for doc, score in results if score >= self.score_threshold]
+        except Exception as e:
+            print("召回情景记忆出错:", e)
+            return []
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                # 一次 embeddings 请求写入整批
+                self.store.add_texts(
+                    [text for _, text, _ in batch],
+                    metadatas=[{"session_id": session_id, "created_at": created_at} for session_id, _, created_at in batch],
+                )
+            except Exception as e:
+                print("写入情景记忆出错:", e)
+
+
+_episodic = None
+_episodic_lock = threading.Lock()
+
+def get_episodic_memory() -> EpisodicMemory:
+    global _episodic
+    with _episodic_lock:
+        if _episodic is None:
+            _episodic = EpisodicMemory()
+        return _episodic
@@ -0,0 +1,191 @@
+import os
+import json
+import uuid
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+from src.Knowledge import KNOWLEDGE_COLLECTION, SparseIndex, get_sparse_index
+from src.VectorStore import get_vector_store
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# 切分参数沿用 .env 中的 CHUNK_SIZE / CHUNK_OVERLAP
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+# 每批向量化并写入的分块数 / 解析进程数 / 清单文件
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "128"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2)))
+INGEST_MANIFEST = os.getenv("INGEST_MANIFEST", os.path.join("data", "ingest_manifest.json"))
+SUPPORTED_SUFFIXES = {".pdf", ".txt", ".md", ".docx", ".doc", ".html", ".htm", ".pptx"}
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_and_split(path: str) -> List[Tuple[str, dict]]:
+    """在子进程中解析并切分一个文件，只返回 (文本, 元数据)，便于跨进程传递"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".pdf":
+        from langchain_community.document_loaders import PyMuPDFLoader
+        loader = PyMuPDFLoader(path)
+    elif suffix in (".txt", ".md"):
+        from langchain_community.document_loaders import TextLoader
+        loader = TextLoader(path, encoding="utf-8", autodetect_encoding=True)
+    else:
+        from langchain_unstructured import UnstructuredLoader
+        loader = UnstructuredLoader(path)
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    # lazy_load 逐页产出，避免整本文档常驻内存
+    for document in loader.lazy_load():
+        for chunk in splitter.split_documents([document]):
+            metadata = {"source": path}
+            if "page" in chunk.metadata:
+                metadata["page"] = chunk.metadata["page"]
+            chunks.append((chunk.page_content, metadata))
+    return chunks
+
+
+def iter_files(root: str) -> Iterator[str]:
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_SUFFIXES:
+                yield os.path.join(directory, filename)
+
+
+class Manifest:
+    """记录每个文件的内容哈希和对应的向量 id"""
+    def __init__(self, path: str = INGEST_MANIFEST):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.files = json.load(f)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.files, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class IngestPipeline:
+    """流式入库：扫描 -> 解析切分(多进程) -> 批量向量化 -> 写入 Qdrant 和 BM25 索引
+    内容哈希未变的文件直接跳过，已删除文件的向量会被移除。
+    """
+    def __init__(self, store=None, manifest: Manifest = None, batch_size: int = INGEST_BATCH_SIZE,
+                 workers: int = INGEST_WORKERS, sparse: SparseIndex = None):
+        self.store = store or get_vector_store(KNOWLEDGE_COLLECTION)
+        self.sparse = sparse or get_sparse_index()
+        self.manifest = manifest or Manifest()
+        self.batch_size = batch_size
+        self.workers = workers
+        self.report = {"skipped": 0, "indexed": 0, "removed": 0, "chunks": 0, "failed": 0}
+        self._batch = []
+        self._pending = {}
+        self._removed = []
+
+    def _changed_files(self, root: str) -> Iterator[Tuple[str, str]]:
+        seen = set()
+        for path in iter_files(root):
+            seen.add(path)
+            digest = file_hash(path)
+            entry = self.manifest.files.get(path)
+            if entry and entry["hash"] == digest:
+                self.report["skipped"] += 1
+                continue
+            yield path, digest
+        # 只处理 root 目录下的文件，/x/docs2 不能被当成 /x/docs 的子目录
+        prefix = root.rstrip(os.sep) + os.sep
+        self._removed = [path for path in self.manifest.files if path.startswith(prefix) and path not in seen]
+
+    def _parsed(self, files: Iterator[Tuple[str, str]]) -> Iterator[Tuple[str, str, list]]:
+        """并行解析，最多同时有 workers*2 个文件在途，内存占用有上限"""
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = deque()
+            for path, digest in files:
+                in_flight.append((path, digest, executor.submit(_load_and_split, path)))
+                if len(in_flight) >= self.workers * 2:
+                    yield self._result(*in_flight.popleft())
+            while in_flight:
+                yield self._result(*in_flight.popleft())
+
+    def _result(self, path, digest, future):
+        try:
+            return path, digest, future.result()
+        except Exception as e:
+            print(f"解析失败 {path}: {e}")
+            self.report["failed"] += 1
+            return path, digest, None
+
+    def _flush(self):
+        if self._batch:
+            texts, metadatas, ids = zip(*self._batch)
+            self.store.add_texts(list(texts), metadatas=list(metadatas), ids=list(ids), batch_size=len(texts))
+            self.sparse.add(list(ids), list(texts), list(metadatas))
+            self.report["chunks"] += len(self._batch)
+            self._batch = []
+        # 本批之前已完整入队的文件此时全部写入完成：删掉旧版本的向量并更新清单
+        for path, (digest, ids) in self._pending.items():
+            old = self.manifest.files.get(path)
+            if old:
+                self._delete(old["ids"])
+            self.manifest.files[path] = {"hash": digest, "ids": ids}
+            self.report["indexed"] += 1
+        self._pending = {}
+        self.manifest.save()
+
+    def _delete(self, ids: list):
+        if ids:
+            self.store.delete(ids=ids)
+            self.sparse.delete(ids)
+
+    def run(self, root: str) -> dict:
+        for path, digest, chunks in self._parsed(self._changed_files(root)):
+            if chunks is None:
+                continue
+            ids = []
+            for index, (text, metadata) in enumerate(chunks):
+                # id 由路径、内容哈希和序号决定，重复运行结果一致
+                point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{path}:{digest}:{index}"))
+                ids.append(point_id)
+                self._batch.append((text, metadata, point_id))
+                if len(self._batch) >= self.batch_size:
+                    self._flush()
+            self._pending[path] = (digest, ids)
+        self._flush()
+
+        for path in self._removed:
+            self._delete(self.manifest.files.pop(path)["ids"])
+            self.report["removed"] += 1
+        self.manifest.save()
+        return self.report
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="增量构建本地知识库")
+    parser.add_argument("root", help="知识库文件目录")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    options = parser.parse_args()
+
+    report = IngestPipeline(batch_size=options.batch_size, workers=options.workers).run(os.path.abspath(options.root))
+    print(f"新增/更新文件: {report['indexed']}，跳过未变文件: {report['skipped']}，"
+          f"删除文件: {report['removed']}，失败: {report['failed']}，写入分块: {report['chunks']}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,182 @@
+import os
+import re
+import json
+import heapq
+import asyncio
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Any, List
+from rank_bm25 import BM25Okapi
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.VectorStore import get_vector_store
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# 本地知识库集合名 / 召回条数 / 最低相似度
+KNOWLEDGE_COLLECTION = os.getenv("EMBEDDING_COLLECTION", "MagicCat")
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+RAG_SCORE_THRESHOLD = float(os.getenv("RAG_SCORE_THRESHOLD", "0.5"))
+# 混合检索：开关 / 每路召回的候选数 / RRF 平滑常数 / BM25 索引路径
+RAG_HYBRID = os.getenv("RAG_HYBRID", "1") == "1"
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "12"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", os.path.join("data", "bm25.db"))
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.]*|[\u4e00-\u9fff]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """BM25 分词：英文标识符整体保留（API 名、报错信息），并拆出 . 和 _ 分隔的部分；中文按字二元组切分"""
+    tokens = []
+    for word in _TOKEN_PATTERN.findall(text):
+        if word[0] >= "\u4e00":
+            tokens.extend([word] if len(word) == 1 else [word[i:i + 2] for i in range(len(word) - 1)])
+            continue
+        word = word.lower().strip(".")
+        if not word:
+            continue
+        tokens.append(word)
+        parts = [part for part in re.split(r"[._]", word) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class SparseIndex:
+    """持久化的 BM25 索引：分词结果存在 SQLite，按文档 id 增量增删，检索时只在数据变化后重建 BM25 统计"""
+    def __init__(self, path: str = BM25_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 单连接加锁：PRAGMA data_version 只对同一连接有意义，用来感知其他进程（入库任务）的写入
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._bm25 = None
+        self._ids = []
+        self._version = None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL, tokens TEXT NOT NULL)"
+            )
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict]):
+        rows = [
+            (point_id, text, json.dumps(metadata, ensure_ascii=False), " ".join(tokenize(text)))
+            for point_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", rows)
+            self._bm25 = None
+
+    def delete(self, ids: List[str]):
+        with self._lock, self._conn:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            self._bm25 = None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _load(self):
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._bm25 is not None and version == self._version:
+            return
+        rows = self._conn.execute("SELECT id, tokens FROM chunks").fetchall()
+        self._ids = [row[0] for row in rows]
+        self._bm25 = BM25Okapi([row[1].split(" ") if row[1] else [] for row in rows]) if rows else None
+        self._version = version
+
+    def search(self, query: str, k: int = RAG_CANDIDATES) -> List[Document]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            self._load()
+            if self._bm25 is None:
+                return []
+            scores = self._bm25.get_scores(tokens)
+            top = [i for i in heapq.nlargest(k, range(len(self._ids)), key=scores.__getitem__) if scores[i] > 0]
+            ids = [self._ids[i] for i in top]
+            if not ids:
+                return []
+            rows = {
+                row[0]: row[1:]
+                for row in self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(ids))})", ids
+                )
+            }
+        documents = []
+        for point_id in ids:
+            if point_id in rows:
+                text, metadata = rows[point_id]
+                documents.append(Document(page_content=text, metadata={**json.loads(metadata), "_id": point_id}))
+        return documents
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = RRF_K, top_n: int = None) -> List[Document]:
+    """RRF 融合：score(d) = sum(1 / (k + rank))，按向量 id 去重"""
+    scores, documents = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = str(doc.metadata.get("_id") or doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:top_n]]
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + Qdrant 混合检索，两路各召回候选后用 RRF 融合取 top_k"""
+    dense: BaseRetriever
+    sparse: Any
+    top_k: int = RAG_TOP_K
+    candidates: int = RAG_CANDIDATES
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return reciprocal_rank_fusion(
+            [self.dense.invoke(query), self.sparse.search(query, self.candidates)], top_n=self.top_k
+        )
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        dense, sparse = await asyncio.gather(
+            self.dense.ainvoke(query), asyncio.to_thread(self.sparse.search, query, self.candidates)
+        )
+        return reciprocal_rank_fusion([dense, sparse], top_n=self.top_k)
+
+
+_sparse_index = None
+_sparse_lock = threading.Lock()
+
+def get_sparse_index() -> SparseIndex:
+    global _sparse_index
+    with _sparse_lock:
+        if _sparse_index is None:
+            _sparse_index = SparseIndex()
+        return _sparse_index
+
+
+@lru_cache(maxsize=None)
+def get_knowledge_retriever(top_k: int = RAG_TOP_K, score_threshold: float = RAG_SCORE_THRESHOLD) -> BaseRetriever:
+    """进程内复用的知识库检索器，底层 Qdrant 客户端和向量库只创建一次"""
+    dense = get_vector_store(KNOWLEDGE_COLLECTION).as_retriever(
+        search_type="similarity_score_threshold",
+        search_kwargs={"k": RAG_CANDIDATES if RAG_HYBRID else top_k, "score_threshold": score_threshold},
+    )
+    if not RAG_HYBRID:
+        return dense
+    return HybridRetriever(dense=dense, sparse=get_sparse_index(), top_k=top_k, candidates=RAG_CANDIDATES)
+
+
+def format_documents(docs) -> str:
+    if not docs:
+        return "本地知识库中没有找到相关内容"
+    return "\n\n".join(
+        f"[{doc.metadata.get('source', '知识库')}]\n{doc.page_content}" for doc in docs
+    )
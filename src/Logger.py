@@ -0,0 +1,100 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+LOG_NAME = "MagicCat"
+LOG_DIR = os.getenv("LOG_DIR", "log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# 轮转方式：size 按大小，time 按时间（每天午夜）
+LOG_ROTATE = os.getenv("LOG_ROTATE", "size")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [session=%(session_id)s msg=%(message_id)s%(latency)s] %(message)s"
+
+# 每条消息的结构化字段，随协程上下文传递
+_log_context = contextvars.ContextVar("log_context", default=None)
+
+_listener = None
+
+
+class ContextFilter(logging.Filter):
+    """把当前消息的 session_id / message_id / 各阶段耗时写入日志记录"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get() or {}
+        record.session_id = context.get("session_id", "-")
+        record.message_id = context.get("message_id", "-")
+        latencies = context.get("latencies", {})
+        record.latencies = dict(latencies)
+        record.latency = "".join(f" {k}={v:.1f}ms" for k, v in latencies.items())
+        return True
+
+
+def setup_logging() -> logging.Logger:
+    """只在启动时调用一次：业务线程只把记录放入队列，格式化和写文件在后台线程完成"""
+    global _listener
+    logger = logging.getLogger(LOG_NAME)
+    if _listener is not None:
+        return logger
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{LOG_NAME}.log")
+    if LOG_ROTATE == "time":
+        file_handler = TimedRotatingFileHandler(log_path, when="midnight", backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    else:
+        file_handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    # 过滤器挂在队列入口，保证上下文字段在产生日志的协程里读取
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+@contextmanager
+def log_context(session_id: str = "-", message_id: str = "-"):
+    """为一条消息的处理过程绑定结构化日志字段"""
+    token = _log_context.set({"session_id": session_id, "message_id": message_id, "latencies": {}})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+@contextmanager
+def log_stage(name: str):
+    """记录当前消息某个处理阶段的耗时(毫秒)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        context = _log_context.get()
+        if context is not None:
+            context["latencies"][name] = (time.perf_counter() - start) * 1000
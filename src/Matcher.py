@@ -0,0 +1,130 @@
+import os
+import re
+import difflib
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# 本地日程匹配：最低得分 / 第一名领先第二名的最小差距 / 打平时交给大模型的候选数
+MATCH_MIN_SCORE = float(os.getenv("MATCH_MIN_SCORE", "0.45"))
+MATCH_MARGIN = float(os.getenv("MATCH_MARGIN", "0.15"))
+MATCH_LLM_CANDIDATES = int(os.getenv("MATCH_LLM_CANDIDATES", "3"))
+# 第一名得分低于这个值时本地打分没有区分度，不缩减候选，全部交给大模型
+MATCH_NARROW_SCORE = float(os.getenv("MATCH_NARROW_SCORE", "0.2"))
+# 标题 / 描述 / 时间三项的权重，未提供的项不参与计分
+MATCH_WEIGHTS = {"summary": 0.6, "description": 0.15, "time": 0.25}
+
+_CHINA_TZ = timezone(timedelta(hours=8))
+_PUNCTUATION = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def parse_time(value: dict) -> Optional[float]:
+    """把钉钉日程的 {"dateTime": ...} 或 {"date": ...} 转成时间戳；全天日程按东八区零点"""
+    if not value:
+        return None
+    try:
+        if value.get("dateTime"):
+            moment = datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=_CHINA_TZ)
+            return moment.timestamp()
+        if value.get("date"):
+            return datetime.fromisoformat(value["date"]).replace(tzinfo=_CHINA_TZ).timestamp()
+    except ValueError:
+        return None
+    return None
+
+
+def event_window(event: dict) -> Tuple[Optional[float], Optional[float]]:
+    start = parse_time(event.get("start"))
+    end = parse_time(event.get("end"))
+    if start is not None and end is None:
+        end = start
+    return start, end
+
+
+def hint_window(start: dict = None, end: dict = None) -> Optional[Tuple[float, float]]:
+    """用户给出的开始/结束时间转成时间区间，只给一端时视为一个时间点"""
+    start_ts, end_ts = parse_time(start), parse_time(end)
+    if start_ts is None and end_ts is None:
+        return None
+    start_ts = end_ts if start_ts is None else start_ts
+    end_ts = start_ts if end_ts is None else end_ts
+    return min(start_ts, end_ts), max(start_ts, end_ts)
+
+
+def _normalize(text: str) -> str:
+    return _PUNCTUATION.sub("", text or "").lower()
+
+
+def _bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)} if len(text) > 1 else {text}
+
+
+def text_similarity(query: str, text: str) -> float:
+    """编辑相似度和字二元组覆盖率取大者，"周会" 对 "产品周会" 这类包含关系也能得高分"""
+    query, text = _normalize(query), _normalize(text)
+    if not query or not text:
+        return 0.0
+    if query == text:
+        return 1.0
+    ratio = difflib.SequenceMatcher(None, query, text).ratio()
+    query_grams = _bigrams(query)
+    coverage = len(query_grams & _bigrams(text)) / len(query_grams)
+    return max(ratio, coverage * 0.95)
+
+
+def time_similarity(window: Tuple[float, float], event: dict) -> float:
+    """时间重叠占较短区间的比例；不重叠时按间隔小时数衰减"""
+    start, end = event_window(event)
+    if start is None:
+        return 0.0
+    hint_start, hint_end = window
+    overlap = min(hint_end, end) - max(hint_start, start)
+    shortest = min(hint_end - hint_start, end - start)
+    if overlap > 0 or (overlap == 0 and shortest == 0):
+        return min(1.0, overlap / shortest) if shortest > 0 else 1.0
+    gap_hours = -overlap / 3600
+    return 0.5 / (1 + gap_hours)
+
+
+def score_event(event: dict, summary: str = None, description: str = None,
+                window: Tuple[float, float] = None) -> float:
+    scores = {}
+    if summary:
+        scores["summary"] = max(
+            text_similarity(summary, event.get("summary", "")),
+            0.8 * text_similarity(summary, event.get("description", "")),
+        )
+    if description:
+        scores["description"] = text_similarity(description, event.get("description", "") or event.get("summary", ""))
+    if window and window[0] is not None:
+        scores["time"] = time_similarity(window, event)
+    if not scores:
+        return 0.0
+    total_weight = sum(MATCH_WEIGHTS[name] for name in scores)
+    return sum(MATCH_WEIGHTS[name] * score for name, score in scores.items()) / total_weight
+
+
+def match_event(events: List[dict], summary: str = None, description: str = None,
+                window: Tuple[float, float] = None, min_score: float = MATCH_MIN_SCORE,
+                margin: float = MATCH_MARGIN, candidates: int = MATCH_LLM_CANDIDATES,
+                narrow_score: float = MATCH_NARROW_SCORE):
+    """返回 (明确胜出的日程, 候选日程)：第一名得分足够且领先明显时直接返回，否则返回前几名交给大模型；
+    所有日程得分都很低（例如没有可用的匹配线索）时返回全部日程，避免把真正的目标漏掉"""
+    scored = sorted(
+        ((score_event(event, summary, description, window), event) for event in events),
+        key=lambda item: item[0], reverse=True,
+    )
+    ranked = [event for _, event in scored]
+    if scored and scored[0][0] >= min_score and (len(scored) == 1 or scored[0][0] - scored[1][0] >= margin):
+        return ranked[0], ranked[:1]
+    if not scored or scored[0][0] < narrow_score:
+        return None, ranked
+    return None, ranked[:candidates]
+
+
+def compact_event(event: dict) -> dict:
+    """交给大模型时只保留匹配需要的字段"""
+    return {key: event.get(key) for key in ("id", "summary", "description", "start", "end", "isAllDay")}
@@ -1,58 +1,590 @@
 from langchain.memory import ConversationBufferMemory
-from langchain_community.chat_message_histories import RedisChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, get_buffer_string
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
-from src.Prompt import PromptClass
+from src.Prompt import SYSTEM_PROMPT, MOODS
+from src.Models import get_chat_model
+from src.RedisPool import get_redis_client, redis_url
+from src.Codec import encode_message, encode_record, decode_record, decode_messages
+from src.Archive import get_session_archive
+from src.Episodic import get_episodic_memory
 from dotenv import load_dotenv
 load_dotenv()
 import os
+import argparse
+import asyncio
+from redis.exceptions import WatchError
+import tiktoken
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 
-redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
 print(f"Redis URL: {redis_url}")
 
+# 滚动摘要：原始消息超过 SUMMARY_TRIGGER_TOKENS 时，把最旧的消息折叠进摘要，只保留约 MEMORY_WINDOW_TOKENS 的近期原文
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "3000"))
+MEMORY_WINDOW_TOKENS = int(os.getenv("MEMORY_WINDOW_TOKENS", "1500"))
+# 每轮只读取最近 MEMORY_TAIL_MESSAGES 条原始消息；进程内缓存最近 MEMORY_CACHE_SIZE 个会话窗口，
+# 缓存项最长保留 MEMORY_CACHE_TTL 秒，以便看到其他进程写入的消息
+MEMORY_TAIL_MESSAGES = int(os.getenv("MEMORY_TAIL_MESSAGES", "40"))
+MEMORY_CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "1000"))
+MEMORY_CACHE_TTL = float(os.getenv("MEMORY_CACHE_TTL", "60"))
+# token 预算：系统提示词(含对话摘要) / 历史消息 / agent 中间步骤
+TOKEN_BUDGET = {
+    "system": int(os.getenv("MEMORY_SYSTEM_TOKENS", "1500")),
+    "history": int(os.getenv("MEMORY_HISTORY_TOKENS", "1000")),
+    "scratchpad": int(os.getenv("MEMORY_SCRATCHPAD_TOKENS", "2000")),
+}
+# 会话空闲 SESSION_TTL 秒后由 Redis 过期；空闲超过 SESSION_ARCHIVE_AFTER 秒的会话先归档到本地磁盘
+# SESSION_ARCHIVE_AFTER 必须小于 SESSION_TTL，SESSION_TTL 为 0 表示不过期
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(30 * 24 * 3600)))
+SESSION_ARCHIVE_AFTER = int(os.getenv("SESSION_ARCHIVE_AFTER", str(7 * 24 * 3600)))
+SESSION_ACTIVITY_KEY = "session_activity"
+# 是否启用向量化的长期情景记忆，默认关闭
+# 未配置 QDRANT_URL 时使用本地磁盘库，同一目录只能被一个进程打开，多进程部署需要先配置 QDRANT_URL
+EPISODIC_MEMORY = os.getenv("EPISODIC_MEMORY", "0") == "1"
+# 后台摘要线程数 / 会话摘要锁的超时(秒)
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+SUMMARY_LOCK_TIMEOUT = int(os.getenv("SUMMARY_LOCK_TIMEOUT", "120"))
+
+# 比较尾部消息后再折叠：如果期间会话被清空或改写，则放弃本次摘要
+_FOLD_SCRIPT = """
+if redis.call('LINDEX', KEYS[1], -1) ~= ARGV[1] then
+    return 0
+end
+for i = 1, tonumber(ARGV[2]) do
+    redis.call('RPOP', KEYS[1])
+end
+redis.call('SET', KEYS[2], ARGV[3])
+redis.call('DECRBY', KEYS[3], ARGV[4])
+if tonumber(ARGV[5]) > 0 then
+    redis.call('EXPIRE', KEYS[2], ARGV[5])
+    redis.call('EXPIRE', KEYS[3], ARGV[5])
+end
+return 1
+"""
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text))
+
+def message_tokens(message: BaseMessage) -> int:
+    """消息的 token 数只计算一次，保存在 response_metadata 中并随消息一起写入 Redis"""
+    token_count = message.response_metadata.get("token_count")
+    if token_count is None:
+        token_count = count_tokens(f"{type(message).__name__}: {message.content}")
+        message.response_metadata["token_count"] = token_count
+    return token_count
+
+def truncate_tokens(text: str, budget: int) -> str:
+    tokens = _encoding().encode(text)
+    return text if len(tokens) <= budget else _encoding().decode(tokens[:budget])
+
+def trim_messages_to_budget(messages: List[BaseMessage], budget: int) -> List[BaseMessage]:
+    """从最新的消息往前保留，总 token 数不超过 budget，保持时间顺序"""
+    kept, used = [], 0
+    for message in reversed(messages):
+        used += message_tokens(message)
+        if used > budget:
+            break
+        kept.append(message)
+    return kept[::-1]
+
+def trim_scratchpad(messages: List[BaseMessage], budget: int = TOKEN_BUDGET["scratchpad"]) -> List[BaseMessage]:
+    """按“AI 调用 + 工具结果”分组裁剪 agent 中间步骤，不拆开同一次工具调用"""
+    groups = []
+    for message in messages:
+        if isinstance(message, AIMessage) or not groups:
+            groups.append([message])
+        else:
+            groups[-1].append(message)
+    kept, used = [], 0
+    for group in reversed(groups):
+        used += sum(message_tokens(message) for message in group)
+        # 最新一组即使超出预算也保留，否则 agent 看不到刚调用的工具结果
+        if used > budget and kept:
+            break
+        kept = group + kept
+    return kept
+
+@lru_cache(maxsize=1)
+def _system_prompt_tokens() -> int:
+    return count_tokens(SYSTEM_PROMPT)
+
+
+class SessionCache:
+    """按会话缓存 (摘要, 近期消息窗口) 的 LRU 缓存，线程安全
+    每次写入或失效都会递增版本号；读取 Redis 之前先取版本号，期间会话有变化时不回写缓存，
+    避免慢读取把旧窗口覆盖到缓存里。
+    """
+    def __init__(self, maxsize: int = MEMORY_CACHE_SIZE, ttl: float = MEMORY_CACHE_TTL, window: int = MEMORY_TAIL_MESSAGES):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.window = window
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        # 被淘汰条目的最大版本号：条目不在缓存中时无法判断读取期间是否有写入，按它保守判断
+        self._evicted_version = 0
+
+    def get(self, session_id: str):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry["messages"] is None:
+                return None
+            if time.monotonic() - entry["loaded_at"] > self.ttl:
+                entry["messages"] = None
+                return None
+            self._entries.move_to_end(session_id)
+            return entry["summary"], list(entry["messages"])
+
+    def version(self) -> int:
+        """读取 Redis 之前调用，结果传给 put"""
+        with self._lock:
+            return self._version
+
+    def put(self, session_id: str, summary: Optional[str], messages: List[BaseMessage], version: int = None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if version is not None:
+                entry = self._entries.get(session_id)
+                changed = entry["version"] if entry is not None else self._evicted_version
+                if changed > version:
+                    return
+            self._store(session_id, {"summary": summary, "messages": list(messages[-self.window:]), "loaded_at": time.monotonic()})
+
+    def _store(self, session_id: str, entry: dict):
+        self._version += 1
+        entry["version"] = self._version
+        self._entries[session_id] = entry
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.maxsize:
+            _, evicted = self._entries.popitem(last=False)
+            self._evicted_version = max(self._evicted_version, evicted["version"])
+
+    def append(self, session_id: str, message: BaseMessage, version: int = None):
+        """写入时更新已缓存的窗口；未缓存的会话只记录版本，等下次读取时再加载
+        version 为写入 Redis 之前取的版本号：之后缓存被重新加载过时，窗口里可能已经有这条消息，直接失效
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and version is not None and entry["version"] > version:
+                self._store(session_id, {"summary": None, "messages": None, "loaded_at": 0.0})
+            elif entry is not None and entry["messages"] is not None:
+                entry["messages"].append(message)
+                del entry["messages"][:-self.window]
+                self._version += 1
+                entry["version"] = self._version
+            else:
+                self._store(session_id, {"summary": None, "messages": None, "loaded_at": 0.0})
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._store(session_id, {"summary": None, "messages": None, "loaded_at": 0.0})
+
+session_cache = SessionCache()
+
+
+class RedisChatMessageHistory(BaseChatMessageHistory):
+    """基于共享连接池的会话历史，键与 langchain_community 的实现一致，消息使用 Codec 的紧凑编码"""
+    def __init__(self, session_id: str, key_prefix: str = "message_store:", ttl: Optional[int] = SESSION_TTL or None):
+        self.redis_client = get_redis_client()
+        self.session_id = session_id
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self._cached_summary = None
+
+    @property
+    def key(self) -> str:
+        return self.key_prefix + self.session_id
+
+    @property
+    def summary_key(self) -> str:
+        return "summary_store:" + self.session_id
+
+    @property
+    def tokens_key(self) -> str:
+        return "token_count:" + self.session_id
+
+    @property
+    def summary(self) -> Optional[str]:
+        value = self.redis_client.get(self.summary_key)
+        return value.decode("utf-8") if value else None
+
+    @property
+    def token_total(self) -> Optional[int]:
+        """窗口内原始消息的 token 总数；旧会话没有计数时返回 None"""
+        value = self.redis_client.get(self.tokens_key)
+        return int(value) if value is not None else None
+
+    def _window_items(self) -> list:
+        return self.redis_client.lrange(self.key, 0, -1)[::-1]
+
+    @property
+    def window_messages(self) -> List[BaseMessage]:
+        """尚未折叠进摘要的原始消息，按时间正序"""
+        return decode_messages(self._window_items())
+
+    def tail_messages(self, limit: int = MEMORY_TAIL_MESSAGES) -> List[BaseMessage]:
+        """只读取最近 limit 条原始消息，优先使用进程内缓存"""
+        if limit <= session_cache.window:
+            cached = session_cache.get(self.session_id)
+            if cached is not None:
+                self._cached_summary = cached[0]
+                return cached[1][-limit:]
+
+        version = session_cache.version()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.lrange(self.key, 0, max(limit, session_cache.window) - 1)
+        pipe.get(self.summary_key)
+        _items, summary = pipe.execute()
+        summary = summary.decode("utf-8") if summary else None
+        messages = decode_messages(_items[::-1])
+        session_cache.put(self.session_id, summary, messages, version)
+        self._cached_summary = summary
+        return messages[-limit:]
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        messages = self.tail_messages()
+        summary = self._cached_summary
+        if summary:
+            messages.insert(0, SystemMessage(content=f"之前对话的摘要：{summary}"))
+        return messages
+
+    def fold(self, oldest: bytes, count: int, summary: str, tokens: int) -> bool:
+        """原子地把最旧的 count 条消息替换为新的摘要
+        列表头部是最新消息，从尾部弹出最旧的消息，不影响并发追加的新消息；
+        oldest 为读取时的最旧一条原始数据，不一致说明会话已被改写，返回 False。
+        """
+        script = self.redis_client.register_script(_FOLD_SCRIPT)
+        folded = bool(script(
+            keys=[self.key, self.summary_key, self.tokens_key],
+            args=[oldest, count, summary, tokens, self.ttl or 0],
+        ))
+        session_cache.invalidate(self.session_id)
+        return folded
+
+    def init_token_total(self) -> int:
+        """旧会话没有 token 计数时按当前窗口补上，返回窗口的 token 总数
+        计数和过期时间在同一个事务里写入，缺少 token 数的旧消息一并写回；读取期间会话被追加或折叠则重新计算。
+        """
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key)
+                    items = pipe.lrange(self.key, 0, -1)
+                    if not items:
+                        pipe.unwatch()
+                        return 0
+                    messages = decode_messages(items)
+                    legacy = [message.response_metadata.get("token_count") is None for message in messages]
+                    total = sum(message_tokens(message) for message in messages)
+                    # 未设置会话 TTL 时跟随消息列表剩余的过期时间
+                    expire_ms = self.ttl * 1000 if self.ttl else pipe.pttl(self.key)
+                    pipe.multi()
+                    if any(legacy):
+                        # 旧消息没有保存 token 数，补上后写回，之后读取不再重新分词
+                        pipe.delete(self.key)
+                        pipe.rpush(self.key, *[
+                            encode_message(message) if missing else item
+                            for message, item, missing in zip(messages, items, legacy)
+                        ])
+                        if expire_ms > 0:
+                            pipe.pexpire(self.key, expire_ms)
+                    pipe.set(self.tokens_key, total, px=expire_ms if expire_ms > 0 else None)
+                    pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        session_cache.invalidate(self.session_id)
+        return total
+
+    def add_message(self, message: BaseMessage) -> None:
+        token_count = message_tokens(message)
+        version = session_cache.version()
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.lpush(self.key, encode_message(message))
+        pipe.incrby(self.tokens_key, token_count)
+        self._touch(pipe)
+        pipe.execute()
+        session_cache.append(self.session_id, message, version)
+
+    def clear(self) -> None:
+        self.redis_client.delete(self.key, self.summary_key, self.tokens_key)
+        session_cache.invalidate(self.session_id)
+
+    def _touch(self, pipe):
+        pipe.zadd(SESSION_ACTIVITY_KEY, {self.session_id: time.time()})
+        if self.ttl:
+            for key in (self.key, self.summary_key, self.tokens_key):
+                pipe.expire(key, self.ttl)
+
+    def touch(self) -> None:
+        """记录会话活跃时间并顺延空闲过期时间"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._touch(pipe)
+        pipe.execute()
+
+    def rehydrate(self) -> bool:
+        """会话已被归档时，从本地归档恢复到 Redis"""
+        archive = get_session_archive()
+        record = archive.get(self.session_id)
+        if record is None:
+            return False
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.exists(self.key):
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                if record["items"]:
+                    pipe.rpush(self.key, *record["items"])
+                if record["summary"]:
+                    pipe.set(self.summary_key, record["summary"])
+                if record["token_total"] is not None:
+                    pipe.set(self.tokens_key, record["token_total"])
+                self._touch(pipe)
+                pipe.execute()
+            except WatchError:
+                return False
+        archive.delete(self.session_id)
+        session_cache.invalidate(self.session_id)
+        print(f"已从归档恢复会话: {self.session_id}")
+        return True
+
+    def archive(self) -> bool:
+        """把会话写入本地归档并从 Redis 删除；归档期间会话有新写入则放弃"""
+        archive = get_session_archive()
+        keys = (self.key, self.summary_key, self.tokens_key)
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(*keys)
+                items = pipe.lrange(self.key, 0, -1)
+                summary = pipe.get(self.summary_key)
+                token_total = pipe.get(self.tokens_key)
+                if items or summary:
+                    archive.put(
+                        self.session_id,
+                        items,
+                        summary.decode("utf-8") if summary else None,
+                        int(token_total) if token_total is not None else None,
+                    )
+                pipe.multi()
+                pipe.delete(*keys)
+                pipe.zrem(SESSION_ACTIVITY_KEY, self.session_id)
+                pipe.execute()
+            except WatchError:
+                archive.delete(self.session_id)
+                return False
+        session_cache.invalidate(self.session_id)
+        return True
+
+
+def archive_idle_sessions(idle_seconds: int = SESSION_ARCHIVE_AFTER) -> int:
+    """归档空闲超过 idle_seconds 的会话，返回归档数量"""
+    redis_client = get_redis_client()
+    archived = 0
+    for session_id in redis_client.zrangebyscore(SESSION_ACTIVITY_KEY, "-inf", time.time() - idle_seconds):
+        if RedisChatMessageHistory(session_id.decode("utf-8")).archive():
+            archived += 1
+    return archived
+
+def session_stats() -> dict:
+    return {
+        "hot": get_redis_client().zcard(SESSION_ACTIVITY_KEY),
+        "cold": get_session_archive().count(),
+    }
+
+def start_session_archiver(interval: int = 3600) -> threading.Thread:
+    """后台定期归档空闲会话"""
+    def _loop():
+        while True:
+            try:
+                archived = archive_idle_sessions()
+                if archived:
+                    print(f"已归档 {archived} 个空闲会话")
+            except Exception as e:
+                print("归档会话出错:", e)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=_loop, name="session-archiver", daemon=True)
+    thread.start()
+    return thread
+
+
+class TokenBudgetMemory(ConversationBufferMemory):
+    """按 token 预算裁剪后再放入提示词的对话记忆
+    对话摘要计入 system 预算，原始消息计入 history 预算，使用消息上缓存的 token 数，不会重复分词。
+    """
+    max_token_limit: int = TOKEN_BUDGET["history"]
+    system_token_limit: int = TOKEN_BUDGET["system"]
+    session_id: str = ""
+    episodic: Any = None
+
+    @property
+    def buffer_as_messages(self) -> List[BaseMessage]:
+        messages = self.chat_memory.messages
+        summary = None
+        if messages and isinstance(messages[0], SystemMessage):
+            summary, messages = messages[0], messages[1:]
+        messages = trim_messages_to_budget(messages, self.max_token_limit)
+        if summary is not None:
+            budget = max(0, self.system_token_limit - _system_prompt_tokens())
+            if budget:
+                messages.insert(0, SystemMessage(content=truncate_tokens(summary.content, budget)))
+        return messages
+
+    @property
+    def buffer_as_str(self) -> str:
+        return get_buffer_string(
+            self.buffer_as_messages,
+            human_prefix=self.human_prefix,
+            ai_prefix=self.ai_prefix,
+        )
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """近期窗口之外，再按当前输入召回 top-k 条相关的历史片段"""
+        messages = self.buffer_as_messages
+        query = inputs.get(self.input_key or "input")
+        if self.episodic is not None and query:
+            episodes = self.episodic.recall(self.session_id, query)
+            if episodes:
+                position = 1 if messages and isinstance(messages[0], SystemMessage) else 0
+                messages.insert(position, SystemMessage(content="相关的历史对话片段：\n" + "\n---\n".join(episodes)))
+        if not self.return_messages:
+            messages = get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        return {self.memory_key: messages}
+
+    async def aload_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # 向量召回和 Redis 读取都是同步调用，放到线程中执行，不阻塞事件循环
+        return await asyncio.to_thread(self.load_memory_variables, inputs)
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        if self.episodic is not None:
+            # 只入队，向量化在后台批量进行
+            self.episodic.remember(
+                self.session_id,
+                inputs.get(self.input_key or "input", ""),
+                outputs.get(self.output_key or "output", ""),
+            )
+
+
+##### 后台摘要：不在用户请求里等待 LLM 总结
+_summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary")
+_pending_sessions = set()
+_pending_lock = threading.Lock()
+
+def schedule_summary(memory: "MemoryClass", session_id: str) -> bool:
+    """提交会话的后台摘要任务，同一会话在本进程内只排队一次"""
+    with _pending_lock:
+        if session_id in _pending_sessions:
+            return False
+        _pending_sessions.add(session_id)
+    _summary_executor.submit(_run_summary, memory, session_id)
+    return True
+
+def _run_summary(memory: "MemoryClass", session_id: str):
+    try:
+        history = RedisChatMessageHistory(session_id=session_id)
+        # 跨进程的会话锁，保证同一段历史只有一个 worker 在总结
+        lock = history.redis_client.lock(f"summary_lock:{session_id}", timeout=SUMMARY_LOCK_TIMEOUT, blocking=False)
+        if not lock.acquire():
+            return
+        try:
+            memory.summarize(history)
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass
+    except Exception as e:
+        print("后台摘要出错:", e)
+    finally:
+        with _pending_lock:
+            _pending_sessions.discard(session_id)
+
+@lru_cache(maxsize=1)
+def _summary_prompt() -> ChatPromptTemplate:
+    SystemPrompt = SYSTEM_PROMPT.format(feelScore=5, who_you_are="")
+    return ChatPromptTemplate.from_messages([
+        ("system", SystemPrompt + "\n这是一段你和用户的对话记忆，对其进行总结摘要，摘要使用第一人称'我'，并且提取其"
+            "中的关键信息。如果提供了已有摘要，请把新增对话合并进去，输出一份完整的新摘要。"),
+        ("user", "{input}")
+    ])
+
 class MemoryClass:
     def __init__(self, memorykey="chat_history", model=os.getenv("BASE_MODEL")):
         self.memorykey = memorykey
         self.memory = []
-        self.chatmodel = ChatOpenAI(model=model)
+        self.chatmodel = get_chat_model(model)
     
     def summary_chain(self, store_message):
         try:
-            SystemPrompt = PromptClass().SystemPrompt.format(feelScore=5, who_you_are="")
-            Moods = PromptClass().MOODS
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", SystemPrompt + "\n这是一段你和用户的对话记忆，对其进行总结摘要，摘要使用第一人称'我'，并且提取其"),
-                ("user", "{input}")
-            ])
-            chain = prompt | self.chatmodel
-            summary = chain.invoke({"input": store_message, "who_you_are": Moods["default"]["roloSet"]})
+            chain = _summary_prompt() | self.chatmodel
+            summary = chain.invoke({"input": store_message, "who_you_are": MOODS["default"]["roloSet"]})
             return summary
         except KeyError as e:
             print("总结出错")
             print(e)
 
+    def summarize(self, chat_message_history: RedisChatMessageHistory) -> bool:
+        """滚动摘要：只把超出近期窗口的最旧消息折叠进已有摘要"""
+        items = chat_message_history._window_items()
+        store_message = decode_messages(items)
+        tokens = [message_tokens(message) for message in store_message]
+        if sum(tokens) <= SUMMARY_TRIGGER_TOKENS:
+            return False
+
+        # 从最新的消息往前保留 MEMORY_WINDOW_TOKENS 以内的原文
+        keep, kept_tokens = 0, 0
+        for token_count in reversed(tokens):
+            if kept_tokens + token_count > MEMORY_WINDOW_TOKENS:
+                break
+            kept_tokens += token_count
+            keep += 1
+        overflow = store_message[:len(store_message) - keep]
+        if not overflow:
+            return False
+
+        lines = [f"{type(message).__name__}: {message.content}" for message in overflow]
+        previous = chat_message_history.summary
+        if previous:
+            lines.insert(0, f"已有摘要: {previous}\n新增对话:")
+        summary = self.summary_chain("\n".join(lines))
+        if summary is None:
+            return False
+        folded = chat_message_history.fold(items[0], len(overflow), summary.content, sum(tokens[:len(overflow)]))
+        if folded:
+            print(f"已将 {len(overflow)} 条消息折叠进摘要")
+        return folded
+
     def get_memory(self, session_id: str = "session1"):
         try:
             print("session_id:", session_id)
-            print("redis_url:", redis_url)
-            chat_message_history = RedisChatMessageHistory(
-                url=redis_url,
-                session_id=session_id,
-            )
-            # 对超长的聊天记录进行摘要
-            store_message = chat_message_history.messages
-            if len(store_message) > 80:
-                str_message = ""
-                for message in store_message:
-                    str_message += f"{type(message).__name__}: {message.content}"
-                summary = self.summary_chain(str_message)
-                chat_message_history.clear()  # 清空原有的对话
-                chat_message_history.add_message(summary)  # 保存总结
-                print("添加总结后:", chat_message_history.messages)
-                return chat_message_history
-            else:
-                print("go to next step")
-                return chat_message_history
+            chat_message_history = RedisChatMessageHistory(session_id=session_id)
+            token_total = chat_message_history.token_total
+            # 冷会话在用户回来时从本地归档恢复
+            if token_total is None and chat_message_history.rehydrate():
+                token_total = chat_message_history.token_total
+            chat_message_history.touch()
+            # 没有计数的旧会话先补上计数，之后由 add_message 增量维护
+            if token_total is None:
+                token_total = chat_message_history.init_token_total()
+            # 超出预算时在后台做滚动摘要，本轮对话直接使用尚未摘要的原始消息
+            if token_total > SUMMARY_TRIGGER_TOKENS:
+                schedule_summary(self, session_id)
+            return chat_message_history
         except Exception as e:
             print(e)
             return None
@@ -62,16 +594,86 @@ class MemoryClass:
         if chat_memory is None:
             print("chat_memory is None")
             # 创建一个默认的 RedisChatMessageHistory 实例
-            chat_memory = RedisChatMessageHistory(url=redis_url, session_id=session_id)
+            chat_memory = RedisChatMessageHistory(session_id=session_id)
 
-        self.memory = ConversationBufferMemory(
-            llm=self.chatmodel,
+        self.memory = TokenBudgetMemory(
             human_prefix="user",
             ai_prefix="魔法猫猫",
             memory_key=self.memorykey,
             output_key="output",
             return_messages=True,
-            max_token_limit=1000,
+            max_token_limit=TOKEN_BUDGET["history"],
+            system_token_limit=TOKEN_BUDGET["system"],
+            session_id=session_id,
+            episodic=get_episodic_memory() if EPISODIC_MEMORY else None,
             chat_memory=chat_memory,
         )
-        return self.memory
\ No newline at end of file
+        return self.memory
+
+
+##### 会话存储管理命令
+def compact_session(redis_client, key: str, dry_run: bool = False) -> tuple:
+    """用紧凑编码重写一个会话，返回 (重写前字节数, 重写后字节数)"""
+    while True:
+        with redis_client.pipeline(transaction=True) as pipe:
+            try:
+                # 乐观锁：重写期间会话有新写入则重试，避免丢消息
+                pipe.watch(key)
+                items = pipe.lrange(key, 0, -1)
+                ttl = pipe.ttl(key)
+                encoded = [encode_record(decode_record(item)) for item in items]
+                before, after = sum(map(len, items)), sum(map(len, encoded))
+                if dry_run or not items or encoded == items:
+                    pipe.unwatch()
+                    return before, after
+                pipe.multi()
+                pipe.delete(key)
+                pipe.rpush(key, *encoded)
+                if ttl and ttl > 0:
+                    pipe.expire(key, ttl)
+                pipe.execute()
+                return before, after
+            except WatchError:
+                continue
+
+def compact_sessions(pattern: str = "message_store:*", dry_run: bool = False, verbose: bool = False) -> dict:
+    redis_client = get_redis_client()
+    report = {"sessions": 0, "before": 0, "after": 0}
+    for key in redis_client.scan_iter(match=pattern, count=500):
+        before, after = compact_session(redis_client, key, dry_run=dry_run)
+        report["sessions"] += 1
+        report["before"] += before
+        report["after"] += after
+        if verbose:
+            print(f"{key.decode('utf-8')}: {before} -> {after} bytes")
+    return report
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="会话记忆存储管理")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact = subparsers.add_parser("compact", help="把会话历史重写为紧凑编码并报告每个会话的字节数变化")
+    compact.add_argument("--pattern", default="message_store:*")
+    compact.add_argument("--dry-run", action="store_true", help="只统计，不写回")
+    compact.add_argument("--verbose", action="store_true")
+    archive = subparsers.add_parser("archive", help="把空闲会话归档到本地磁盘")
+    archive.add_argument("--idle", type=int, default=SESSION_ARCHIVE_AFTER, help="空闲秒数")
+    subparsers.add_parser("sessions", help="统计 Redis 中的热会话和本地归档的冷会话数量")
+    options = parser.parse_args()
+
+    if options.command == "compact":
+        report = compact_sessions(options.pattern, dry_run=options.dry_run, verbose=options.verbose)
+        sessions = max(report["sessions"], 1)
+        print(f"会话数: {report['sessions']}")
+        print(f"总字节: {report['before']} -> {report['after']}")
+        print(f"平均每个会话: {report['before'] // sessions} -> {report['after'] // sessions} bytes")
+    elif options.command == "archive":
+        print(f"已归档 {archive_idle_sessions(options.idle)} 个会话")
+    elif options.command == "sessions":
+        stats = session_stats()
+        print(f"热会话(Redis): {stats['hot']}")
+        print(f"冷会话(归档): {stats['cold']}")
+
+
+if __name__ == "__main__":
+    _main()
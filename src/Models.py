@@ -0,0 +1,112 @@
+import os
+import asyncio
+import threading
+import weakref
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_openai import ChatOpenAI
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# 所有模型客户端共享的连接池大小
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "20"))
+
+_lock = threading.Lock()
+_models = {}
+_stats = {}
+_http_client = None
+_http_async_client = None
+
+
+class RequestCounter(BaseCallbackHandler):
+    """统计某个模型客户端的请求数和失败数"""
+    def __init__(self, name: str):
+        self.name = name
+
+    def _incr(self, field: str):
+        with _lock:
+            _stats[self.name][field] += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._incr("requests")
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._incr("requests")
+
+    def on_llm_error(self, error, **kwargs):
+        self._incr("errors")
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=OPENAI_POOL_SIZE, max_keepalive_connections=OPENAI_POOL_SIZE)
+
+
+class LoopBoundAsyncClient(httpx.AsyncClient):
+    """交给 ChatOpenAI 的异步客户端：请求转发给当前事件循环自己的连接池，连接不会跨事件循环复用"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._client_kwargs = kwargs
+        self._clients = weakref.WeakKeyDictionary()
+        self._clients_lock = threading.Lock()
+
+    def _current(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(**self._client_kwargs)
+                self._clients[loop] = client
+            return client
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await self._current().send(request, **kwargs)
+
+
+def _shared_http_clients():
+    global _http_client, _http_async_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits())
+        _http_async_client = LoopBoundAsyncClient(limits=_limits())
+    return _http_client, _http_async_client
+
+
+def _freeze(value):
+    """把参数值转成可哈希的缓存键，dict/list 等按内容展开"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted((_freeze(v) for v in value), key=repr))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def get_chat_model(model: str = None, **kwargs) -> ChatOpenAI:
+    """按 (模型名, 参数) 返回共享的 ChatOpenAI 客户端，底层复用同一个连接池"""
+    key = (model, _freeze(kwargs))
+    with _lock:
+        if key not in _models:
+            name = model or "default"
+            if kwargs:
+                name += "(" + ", ".join(f"{k}={v}" for k, v in sorted(kwargs.items())) + ")"
+            _stats.setdefault(name, {"requests": 0, "errors": 0})
+            http_client, http_async_client = _shared_http_clients()
+            params = dict(kwargs)
+            if model:
+                params["model"] = model
+            _models[key] = ChatOpenAI(
+                http_client=http_client,
+                http_async_client=http_async_client,
+                callbacks=[RequestCounter(name)],
+                **params,
+            )
+        return _models[key]
+
+
+def get_model_stats() -> dict:
+    with _lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
@@ -0,0 +1,34 @@
+import os
+import threading
+import redis
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# 连接池配置：最大连接数、健康检查间隔(秒)、读写/建连/等待空闲连接的超时(秒)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "2"))
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_redis_client() -> redis.Redis:
+    """进程内共享的 Redis 客户端；连接耗尽时最多等待 REDIS_POOL_TIMEOUT 秒后报错，不会无限挂起"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                pool = redis.BlockingConnectionPool.from_url(
+                    redis_url,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    timeout=REDIS_POOL_TIMEOUT,
+                    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                )
+                _client = redis.Redis(connection_pool=pool)
+    return _client
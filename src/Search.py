@@ -0,0 +1,137 @@
+import os
+import re
+import time
+import asyncio
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from langchain_community.utilities import SerpAPIWrapper
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# 搜索结果缓存：有效期秒数 / 过期后仍可先返回旧结果的秒数 / 最多缓存条数 / 是否开启先返回旧结果再后台刷新
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_STALE_TTL = int(os.getenv("SEARCH_STALE_TTL", "1800"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_STALE_WHILE_REVALIDATE = os.getenv("SEARCH_STALE_WHILE_REVALIDATE", "1") == "1"
+
+_TRAILING_PUNCTUATION = "?？!！。.,，~～ "
+
+
+def normalize_query(query: str) -> str:
+    """全半角、大小写、多余空白和句尾标点不同的问题视为同一个查询"""
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.rstrip(_TRAILING_PUNCTUATION) or query
+
+
+class SearchCache:
+    """带 TTL 的搜索结果缓存，相同查询并发时只发出一次请求"""
+    def __init__(self, fetch: Callable[[str], str], ttl: int = SEARCH_CACHE_TTL, stale_ttl: int = SEARCH_STALE_TTL,
+                 maxsize: int = SEARCH_CACHE_SIZE, stale_while_revalidate: bool = SEARCH_STALE_WHILE_REVALIDATE):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "deduplicated": 0, "errors": 0}
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-refresh")
+
+    def _lookup(self, key: str):
+        """返回 (缓存结果, 进行中的请求, 是否由当前调用方发起请求)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, fetched_at, original = entry
+                age = time.monotonic() - fetched_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value, None, False
+                if self.stale_while_revalidate and age < self.ttl + self.stale_ttl:
+                    self.stats["stale"] += 1
+                    if key not in self._in_flight:
+                        self._in_flight[key] = Future()
+                        # 用首次请求时的原始问题刷新，不用归一化后的键
+                        self._refresher.submit(self._refresh, key, original)
+                    return value, None, False
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["deduplicated"] += 1
+                return None, future, False
+            self.stats["misses"] += 1
+            future = self._in_flight[key] = Future()
+            return None, future, True
+
+    def _load(self, key: str, query: str) -> str:
+        future = self._in_flight[key]
+        try:
+            value = self.fetch(query)
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key] = (value, time.monotonic(), query)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._in_flight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def _refresh(self, key: str, query: str):
+        try:
+            self._load(key, query)
+        except Exception as e:
+            print("后台刷新搜索结果出错:", e)
+
+    def get(self, query: str) -> str:
+        key = normalize_query(query)
+        value, future, leader = self._lookup(key)
+        if future is None:
+            return value
+        if leader:
+            return self._load(key, query)
+        return future.result()
+
+    async def aget(self, query: str) -> str:
+        key = normalize_query(query)
+        value, future, leader = self._lookup(key)
+        if future is None:
+            return value
+        if leader:
+            return await asyncio.to_thread(self._load, key, query)
+        return await asyncio.wrap_future(future)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats, size=len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_serp = None
+_serp_lock = threading.Lock()
+
+def _serp_search(query: str) -> str:
+    global _serp
+    with _serp_lock:
+        if _serp is None:
+            _serp = SerpAPIWrapper()
+    return _serp.run(query)
+
+
+search_cache = SearchCache(_serp_search)
+
+def get_search_stats() -> dict:
+    return search_cache.get_stats()
@@ -0,0 +1,80 @@
+import os
+import math
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+import numpy as np
+from src.Matcher import parse_time
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# 忙碌区间超过这个数量时用 numpy 向量化合并 / 空闲时段开始时间对齐的分钟粒度
+SLOT_VECTORIZE_THRESHOLD = int(os.getenv("SLOT_VECTORIZE_THRESHOLD", "512"))
+SLOT_STEP_MINUTES = int(os.getenv("SLOT_STEP_MINUTES", "15"))
+# querySchedule 单次请求的最多用户数，参会人更多时拆成多个并发请求
+SCHEDULE_QUERY_BATCH = int(os.getenv("SCHEDULE_QUERY_BATCH", "20"))
+# 待定的日程也视为占用
+BUSY_STATUSES = {"BUSY", "TENTATIVE"}
+
+_CHINA_TZ = timezone(timedelta(hours=8))
+
+
+def busy_intervals(availability: dict, statuses: set = BUSY_STATUSES) -> List[Tuple[float, float]]:
+    """把 querySchedule 返回的所有人的日程块转成 (开始, 结束) 时间戳"""
+    intervals = []
+    for info in (availability or {}).get("scheduleInformation", []):
+        for item in info.get("scheduleItems", []):
+            if item.get("status") not in statuses:
+                continue
+            start, end = parse_time(item.get("start")), parse_time(item.get("end"))
+            if start is not None and end is not None and end > start:
+                intervals.append((start, end))
+    return intervals
+
+
+def merge_intervals(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """排序后一次扫描合并重叠或相接的区间"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def merge_intervals_vectorized(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """numpy 版本：按开始时间排序，结束时间做前缀最大值，开始时间大于此前最大结束时间处即为新区间"""
+    if not intervals:
+        return []
+    data = np.asarray(intervals, dtype=np.float64)
+    data = data[np.argsort(data[:, 0], kind="stable")]
+    starts, ends = data[:, 0], data[:, 1]
+    running_end = np.maximum.accumulate(ends)
+    new_group = np.empty(len(starts), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > running_end[:-1]
+    heads = np.flatnonzero(new_group)
+    return list(zip(starts[heads].tolist(), np.maximum.reduceat(ends, heads).tolist()))
+
+
+def free_slots(intervals: List[Tuple[float, float]], window_start: float, window_end: float, duration: float,
+               limit: int = 3, step: float = SLOT_STEP_MINUTES * 60) -> List[Tuple[float, float]]:
+    """在 [window_start, window_end) 内找最早的 limit 个能容纳 duration 秒的共同空闲时段"""
+    merge = merge_intervals_vectorized if len(intervals) > SLOT_VECTORIZE_THRESHOLD else merge_intervals
+    busy = merge([(max(start, window_start), min(end, window_end))
+                  for start, end in intervals if end > window_start and start < window_end])
+    slots, cursor = [], window_start
+    for start, end in busy + [(window_end, window_end)]:
+        # 空闲段开始时间向上对齐到 step 的整数倍，便于约会议
+        slot_start = math.ceil(cursor / step) * step if step else cursor
+        if start - slot_start >= duration:
+            slots.append((slot_start, start))
+            if len(slots) >= limit:
+                break
+        cursor = max(cursor, end)
+    return slots
+
+
+def format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, _CHINA_TZ).isoformat()
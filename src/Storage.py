@@ -1,18 +1,189 @@
+import os
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional
+from src.RedisPool import get_redis_client
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# 用户表后端：memory 进程内 / redis 多进程共享；USER_TTL 为用户记录的默认过期秒数，0 表示不过期
+USER_STORE = os.getenv("USER_STORE", "memory")
+USER_TTL = int(os.getenv("USER_TTL", "0"))
+
+
+class UserRecord:
+    """用户记录：user_id 为主键（钉钉 unionId，未知时用 staffId），staff_id 建有二级索引"""
+    __slots__ = ("user_id", "staff_id", "nick", "info", "updated_at")
+
+    def __init__(self, user_id: str, staff_id: str = None, nick: str = None, info=None, updated_at: float = None):
+        self.user_id = user_id
+        self.staff_id = staff_id
+        self.nick = nick
+        self.info = info
+        self.updated_at = updated_at or time.time()
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__ if getattr(self, k) is not None}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UserRecord":
+        return cls(**{k: data.get(k) for k in cls.__slots__})
+
+    def __repr__(self):
+        return f"UserRecord({self.to_dict()})"
+
+
+class UserStore(ABC):
+    """用户表接口"""
+    def get(self, user_id: str) -> Optional[UserRecord]:
+        return self.get_many([user_id])[0]
+
+    def put(self, record: UserRecord, ttl: int = None):
+        self.put_many([record], ttl=ttl)
+
+    @abstractmethod
+    def get_many(self, user_ids: List[str]) -> List[Optional[UserRecord]]:
+        ...
+
+    @abstractmethod
+    def put_many(self, records: Iterable[UserRecord], ttl: int = None):
+        ...
+
+    @abstractmethod
+    def delete(self, user_id: str):
+        ...
+
+    @abstractmethod
+    def get_by_staff_id(self, staff_id: str) -> Optional[UserRecord]:
+        ...
+
+    @abstractmethod
+    def all(self) -> Dict[str, UserRecord]:
+        ...
+
+
+class InMemoryUserStore(UserStore):
+    def __init__(self, ttl: int = USER_TTL, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self._records = {}
+        self._expires = {}
+        self._staff_index = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, user_id: str) -> Optional[UserRecord]:
+        expires_at = self._expires.get(user_id)
+        if expires_at is not None and expires_at < self.clock():
+            self._remove(user_id)
+            return None
+        return self._records.get(user_id)
+
+    def _remove(self, user_id: str):
+        record = self._records.pop(user_id, None)
+        self._expires.pop(user_id, None)
+        if record is not None and record.staff_id and self._staff_index.get(record.staff_id) == user_id:
+            del self._staff_index[record.staff_id]
+
+    def get_many(self, user_ids: List[str]) -> List[Optional[UserRecord]]:
+        with self._lock:
+            return [self._alive(user_id) for user_id in user_ids]
+
+    def put_many(self, records: Iterable[UserRecord], ttl: int = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            for record in records:
+                self._remove(record.user_id)
+                self._records[record.user_id] = record
+                if ttl:
+                    self._expires[record.user_id] = self.clock() + ttl
+                if record.staff_id:
+                    self._staff_index[record.staff_id] = record.user_id
+
+    def delete(self, user_id: str):
+        with self._lock:
+            self._remove(user_id)
+
+    def get_by_staff_id(self, staff_id: str) -> Optional[UserRecord]:
+        with self._lock:
+            user_id = self._staff_index.get(staff_id)
+            return self._alive(user_id) if user_id is not None else None
+
+    def all(self) -> Dict[str, UserRecord]:
+        with self._lock:
+            return {user_id: record for user_id in list(self._records) if (record := self._alive(user_id))}
+
+
+class RedisUserStore(UserStore):
+    """Redis 用户表：记录为 user:<user_id> 的紧凑 JSON，staff_id 索引为 user_staff:<staff_id> -> user_id"""
+    def __init__(self, ttl: int = USER_TTL, prefix: str = "user:", redis_client=None):
+        self.redis_client = redis_client or get_redis_client()
+        self.ttl = ttl
+        self.prefix = prefix
+        self.index_prefix = prefix.rstrip(":") + "_staff:"
+
+    def get_many(self, user_ids: List[str]) -> List[Optional[UserRecord]]:
+        if not user_ids:
+            return []
+        values = self.redis_client.mget([self.prefix + user_id for user_id in user_ids])
+        return [UserRecord.from_dict(json.loads(value)) if value else None for value in values]
+
+    def put_many(self, records: Iterable[UserRecord], ttl: int = None):
+        ttl = self.ttl if ttl is None else ttl
+        records = list(records)
+        old_records = self.get_many([record.user_id for record in records])
+        pipe = self.redis_client.pipeline(transaction=False)
+        for record, old in zip(records, old_records):
+            # staff_id 变化时删除旧的索引，避免旧 staffId 仍指向该用户
+            if old is not None and old.staff_id and old.staff_id != record.staff_id:
+                pipe.delete(self.index_prefix + old.staff_id)
+            pipe.set(self.prefix + record.user_id, json.dumps(record.to_dict(), ensure_ascii=False, separators=(",", ":")), ex=ttl or None)
+            if record.staff_id:
+                pipe.set(self.index_prefix + record.staff_id, record.user_id, ex=ttl or None)
+        pipe.execute()
+
+    def delete(self, user_id: str):
+        record = self.get(user_id)
+        keys = [self.prefix + user_id]
+        if record is not None and record.staff_id:
+            keys.append(self.index_prefix + record.staff_id)
+        self.redis_client.delete(*keys)
+
+    def get_by_staff_id(self, staff_id: str) -> Optional[UserRecord]:
+        user_id = self.redis_client.get(self.index_prefix + staff_id)
+        return self.get(user_id.decode("utf-8")) if user_id else None
+
+    def all(self) -> Dict[str, UserRecord]:
+        users = {}
+        keys = list(self.redis_client.scan_iter(match=self.prefix + "*", count=500))
+        for key, value in zip(keys, self.redis_client.mget(keys) if keys else []):
+            if value:
+                users[key.decode("utf-8")[len(self.prefix):]] = UserRecord.from_dict(json.loads(value))
+        return users
+
+
+def create_user_store(backend: str = USER_STORE) -> UserStore:
+    if backend == "redis":
+        return RedisUserStore()
+    return InMemoryUserStore()
+
 ##### 用户表存储系统
-user_storage = {}
+user_store = create_user_store()
 
 def add_user(user_id, user_info):
     # Code to add user information to the storage
-    user_storage[user_id] = user_info
+    user_store.put(UserRecord(user_id, info=user_info))
 
 def get_user(user_id):
     # Code to retrieve user information from the storage
-    return user_storage.get(user_id)
+    record = user_store.get(user_id)
+    return record.info if record is not None else None
 
 def get_all_users():
     # Code to retrieve all user information from the storage
-    return user_storage
+    return {user_id: record.info for user_id, record in user_store.all().items()}
 
 def delete_user(user_id):
     # Code to delete user information from the storage
-    user_storage.pop(user_id, None)
\ No newline at end of file
+    user_store.delete(user_id)
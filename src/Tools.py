@@ -1,45 +1,30 @@
-from typing import Optional
+from typing import List, Optional
 import os
 import time
+import asyncio
+import httpx
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from langchain.agents import tool
-from langchain_community.utilities import SerpAPIWrapper
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from .Memory import MemoryClass
+from .DingTalk import DingTalkClient, AsyncDingTalkClient, run_rate_limited, arun_rate_limited
+from .Models import get_chat_model
+from .Knowledge import get_knowledge_retriever, format_documents
+from .Search import search_cache
+from .Matcher import match_event, hint_window, compact_event, parse_time
+from .Calendar import get_calendar_mirror
+from .Slots import SCHEDULE_QUERY_BATCH, busy_intervals, free_slots, format_time
 from .Storage import get_user
 from langchain_core.output_parsers import PydanticOutputParser
 
-# DingTalk API 客户端
-class DingTalkClient:
-    def __init__(self):
-        self.app_key = os.getenv("DINGDING_ID")
-        self.app_secret = os.getenv("DINGDING_SECRET")
-        self.union_id = os.getenv("DINGDING_UNION_ID")
-
-    def get_access_token(self) -> str:
-        if not all([self.app_key, self.app_secret, self.union_id]):
-            raise ValueError("钉钉配置信息不完整")
-
-        try:
-            response = requests.post(
-                "https://api.dingtalk.com/v1.0/oauth2/accessToken",
-                json={"appKey": self.app_key, "appSecret": self.app_secret}
-            )
-            response.raise_for_status()
-            token = response.json().get("accessToken")
-            if not token:
-                raise ValueError("获取钉钉访问令牌失败")
-            return token
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"获取访问令牌失败: {str(e)}")
-
 # 保持原有的 Pydantic 模型定义
 class TodoInput(BaseModel):
     subject: str = Field(description="待办事项标题")
@@ -79,6 +64,21 @@ class ScheduleModify(BaseModel):
     start: Optional[ScheduleSchemaSet_data] = Field(None, description="日程开始时间")
     end: Optional[ScheduleSchemaSet_data_end] = Field(None, description="日程结束时间")
     summary: Optional[str] = Field(None, description=f"日程标题，最大不超过2048个字符")
+    originalSummary: Optional[str] = Field(None, description="要修改的原日程标题，只用来定位日程，不是修改后的新标题")
+    originalDescription: Optional[str] = Field(None, description="要修改的原日程描述，只用来定位日程，不是修改后的新描述")
+
+class FreeSlotQuery(BaseModel):
+    userIds: List[str] = Field(description="所有参会人的用户ID列表")
+    duration: int = Field(description="会议时长，单位分钟")
+    startTime: str = Field(description="查找范围开始时间，格式必须为: 2020-01-01T10:15:30+08:00,当前时间为{}.".format(time.strftime("%Y-%m-%dT%H:%M:%S+08:00", time.localtime())))
+    endTime: str = Field(description="查找范围结束时间，格式必须为: 2020-01-01T10:15:30+08:00,当前时间为{}.".format(time.strftime("%Y-%m-%dT%H:%M:%S+08:00", time.localtime())))
+    count: int = Field(3, description="返回的空闲时段数量")
+
+class TodoBatch(BaseModel):
+    todos: List[TodoInput] = Field(description="要一次性创建的多个待办事项")
+
+class ScheduleBatch(BaseModel):
+    schedules: List[ScheduleSchemaSet] = Field(description="要一次性创建的多个日程")
 
 # 删除模型
 class DeleteSchedule(BaseModel):
@@ -96,20 +96,22 @@ class ScheduleDel(BaseModel):
 @tool
 def search(query: str) -> str:
     """只有需要了解实时信息或不知道的事情的时候才会使用这个工具。"""
-    serp = SerpAPIWrapper()
-    return serp.run(query)
+    return search_cache.get(query)
 
-@tool
-def create_todo(todo: TodoInput) -> str:
-    """创建一个待办事项
-Args:
-    todo: 包含待办事项信息的对象
-Returns:
-    str: 创建结果消息
-"""
-    client = DingTalkClient()
-    token = client.get_access_token()
+async def asearch(query: str) -> str:
+    return await search_cache.aget(query)
 
+search.coroutine = asearch
+
+def _error_message(e: Exception) -> str:
+    error_message = str(e)
+    response = getattr(e, "response", None)
+    if hasattr(response, 'text'):
+        error_message += f"\nResponse: {response.text}"
+    print(f"Error details: {error_message}")
+    return error_message
+
+def _todo_payload(todo: TodoInput) -> dict:
     todo_data = {
         "subject": todo.subject,
         "notifyConfigs": {"dingNotify": 1}
@@ -121,17 +123,186 @@ Returns:
         todo_data["description"] = todo.description
     if todo.priority:
         todo_data["priority"] = todo.priority
+    return todo_data
+
+def _schedule_window(sets: ScheduleSchemaSet) -> tuple:
+    input_start = sets.start.dateTime if not sets.isAllDay else f"{sets.start.date}T00:00:00+08:00"
+    input_end = sets.end.dateTime if not sets.isAllDay else f"{sets.end.date}T00:00:00+08:00"
+    return input_start, input_end
+
+def _is_busy(availability, input_start: str, input_end: str) -> bool:
+    start, end = parse_time({"dateTime": input_start}), parse_time({"dateTime": input_end})
+    if not isinstance(availability, dict) or start is None or end is None:
+        return False
+    # 转成时间戳比较，不同时区写法的时间字符串也能正确判断重叠
+    return any(item_start < end and item_end > start for item_start, item_end in busy_intervals(availability, {"BUSY"}))
 
+def _response_event(response) -> dict:
     try:
-        response = requests.post(
-            f"https://api.dingtalk.com/v1.0/todo/users/{client.union_id}/tasks",
-            headers={
-                "Content-Type": "application/json",
-                "x-acs-dingtalk-access-token": token
-            },
-            json=todo_data
+        data = response.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def _check_busy(client: DingTalkClient, input_start: str, input_end: str) -> bool:
+    """冲突检查以钉钉忙闲接口为准：它会展开周期日程，并且只有 BUSY 状态才算占用"""
+    schedule_dict = {
+        "schedule": ScheduleSchema(userIds=client.union_id, startTime=input_start, endTime=input_end).model_dump()
+    }
+    return _is_busy(checkSchedule.invoke(schedule_dict), input_start, input_end)
+
+async def _acheck_busy(client: AsyncDingTalkClient, input_start: str, input_end: str) -> bool:
+    availability = await acheckSchedule(ScheduleSchema(userIds=client.union_id, startTime=input_start, endTime=input_end))
+    return _is_busy(availability, input_start, input_end)
+
+def _create_event(client: DingTalkClient, sets: ScheduleSchemaSet):
+    request_data = _schedule_payload(sets)
+    response = client.request(
+        "POST",
+        f"/v1.0/calendar/users/{client.union_id}/calendars/primary/events",
+        json=request_data
+    )
+    get_calendar_mirror(client.union_id).upsert({**request_data, **_response_event(response)})
+
+async def _acreate_event(client: AsyncDingTalkClient, sets: ScheduleSchemaSet):
+    request_data = _schedule_payload(sets)
+    response = await client.request(
+        "POST",
+        f"/v1.0/calendar/users/{client.union_id}/calendars/primary/events",
+        json=request_data
+    )
+    get_calendar_mirror(client.union_id).upsert({**request_data, **_response_event(response)})
+
+def _batch_conflicts(schedules: List[ScheduleSchemaSet]) -> dict:
+    """同一批次内时间互相重叠的日程只保留靠前的一项，返回 {序号: 冲突说明}"""
+    conflicts, accepted = {}, []
+    for i, sets in enumerate(schedules):
+        start, end = (parse_time({"dateTime": value}) for value in _schedule_window(sets))
+        if start is None or end is None:
+            continue
+        clash = next((j for j, (other_start, other_end) in accepted if start < other_end and end > other_start), None)
+        if clash is None:
+            accepted.append((i, (start, end)))
+        else:
+            conflicts[i] = f"与第 {clash + 1} 项日程时间冲突"
+    return conflicts
+
+def _batch_window(schedules: List[ScheduleSchemaSet]) -> Optional[tuple]:
+    """整批日程覆盖的时间范围 (最早开始, 最晚结束)，用于一次查询整批的忙闲"""
+    bounds = []
+    for input_start, input_end in map(_schedule_window, schedules):
+        start, end = parse_time({"dateTime": input_start}), parse_time({"dateTime": input_end})
+        if start is not None and end is not None:
+            bounds.append((start, input_start, end, input_end))
+    if not bounds:
+        return None
+    return min(bounds)[1], max(bounds, key=lambda bound: bound[2])[3]
+
+def _batch_rejections(schedules: List[ScheduleSchemaSet], availability) -> dict:
+    """批次内互相冲突或与已有忙碌日程冲突的项不再创建，返回 {序号: 原因}"""
+    rejected = _batch_conflicts(schedules)
+    for i, sets in enumerate(schedules):
+        if i not in rejected and _is_busy(availability, *_schedule_window(sets)):
+            rejected[i] = "该时间段已有其他日程安排且状态为忙碌"
+    return rejected
+
+def _batch_results(count: int, rejected: dict, created: dict) -> list:
+    return [created[i] if i in created else (False, ValueError(rejected[i])) for i in range(count)]
+
+def _batch_report(kind: str, names: List[str], results: list) -> str:
+    succeeded = sum(1 for ok, _ in results if ok)
+    lines = [f"共 {len(results)} 个{kind}，成功 {succeeded} 个，失败 {len(results) - succeeded} 个"]
+    for i, (name, (ok, result)) in enumerate(zip(names, results), 1):
+        lines.append(f"{i}. {name}：成功" if ok else f"{i}. {name}：失败，{_error_message(result)}")
+    return "\n".join(lines)
+
+def _schedule_payload(sets: ScheduleSchemaSet) -> dict:
+    request_data = {
+        "summary": sets.summary,
+        "description": sets.description,
+        "isAllDay": sets.isAllDay,
+    }
+
+    if sets.isAllDay:
+        request_data["start"] = {"date": sets.start.date}
+        request_data["end"] = {"date": sets.end.date}
+    else:
+        request_data["start"] = {
+            "dateTime": sets.start.dateTime,
+            "timeZone": sets.start.timeZone
+        }
+        request_data["end"] = {
+            "dateTime": sets.end.dateTime,
+            "timeZone": sets.end.timeZone
+        }
+    return request_data
+
+def _modify_payload(search: ScheduleModify, eventid: str, isAllDay: bool) -> dict:
+    request_data = {
+        "id": eventid
+    }
+    if search.summary:
+        request_data["summary"] = search.summary
+    if search.description:
+        request_data["description"] = search.description
+    if search.start:
+        if isAllDay:
+            request_data["start"] = {
+                "date": search.start.date,
+                "dateTime": search.start.dateTime,
+                "timeZone": search.start.timeZone
+            }
+        else:
+            request_data["start"] = {
+                "dateTime": search.start.dateTime,
+                "timeZone": search.start.timeZone
+            }
+    if search.end:
+        if isAllDay:
+            request_data["end"] = {
+                "date": search.end.date,
+                "dateTime": search.end.dateTime,
+                "timeZone": search.end.timeZone
+            }
+        else:
+            request_data["end"] = {
+                "dateTime": search.end.dateTime,
+                "timeZone": search.end.timeZone
+            }
+    return request_data
+
+def _modify_order(search: ScheduleModify) -> str:
+    return f"要修改的原日程标题: {search.originalSummary}, 原日程描述: {search.originalDescription}, 原日程开始时间范围: {search.timeMin} ~ {search.timeMax}"
+
+def _delete_order(query: DeleteSchedule) -> str:
+    return f"description: {query.description}, summary: {query.summary}"
+
+@tool
+def get_info_from_local(query: str) -> str:
+    """当用户询问 langchain 相关的问题时，使用这个工具查询本地知识库。"""
+    return format_documents(get_knowledge_retriever().invoke(query))
+
+async def aget_info_from_local(query: str) -> str:
+    return format_documents(await get_knowledge_retriever().ainvoke(query))
+
+get_info_from_local.coroutine = aget_info_from_local
+
+@tool
+def create_todo(todo: TodoInput) -> str:
+    """创建一个待办事项
+Args:
+    todo: 包含待办事项信息的对象
+Returns:
+    str: 创建结果消息
+"""
+    client = DingTalkClient()
+
+    try:
+        client.request(
+            "POST",
+            f"/v1.0/todo/users/{client.union_id}/tasks",
+            json=_todo_payload(todo)
         )
-        response.raise_for_status()
         return f"成功创建待办事项：{todo.subject}"
     except requests.exceptions.RequestException as e:
         return f"创建待办事项失败：{str(e)}"
@@ -145,22 +316,17 @@ def checkSchedule(schedule: ScheduleSchema) -> str:
         str: 查询结果消息
     """
     client = DingTalkClient()
-    token = client.get_access_token()
 
     try:
-        response = requests.post(
-            f"https://api.dingtalk.com/v1.0/calendar/users/{client.union_id}/querySchedule",
-            headers={
-                "Content-Type": "application/json",
-                "x-acs-dingtalk-access-token": token
-            },
+        response = client.request(
+            "POST",
+            f"/v1.0/calendar/users/{client.union_id}/querySchedule",
             json={
                 "userIds": [client.union_id],
                 "startTime": schedule.startTime,
                 "endTime": schedule.endTime
             }
         )
-        response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         return f"查询日程失败：{str(e)}"
@@ -174,70 +340,17 @@ def SetSchedule(sets: ScheduleSchemaSet) -> str:
         str: 创建结果消息
     """
     client = DingTalkClient()
-    token = client.get_access_token()
 
     # 在创建之前先检查忙闲状态
-    # Extract time info from sets parameter to check availability
-    schedule_schema = ScheduleSchema(
-        userIds=client.union_id,
-        startTime=sets.start.dateTime if not sets.isAllDay else f"{sets.start.date}T00:00:00+08:00",
-        endTime=sets.end.dateTime if not sets.isAllDay else f"{sets.end.date}T00:00:00+08:00"
-    )
-    schedule_dict = {
-        "schedule": schedule_schema.model_dump()
-    }
-    # Check if the time slot is available
-    availability = checkSchedule.invoke(schedule_dict)
-    if availability and "scheduleInformation" in availability:
-        schedule_items = availability["scheduleInformation"][0].get("scheduleItems", [])
-        input_start = sets.start.dateTime if not sets.isAllDay else f"{sets.start.date}T00:00:00+08:00"
-        input_end = sets.end.dateTime if not sets.isAllDay else f"{sets.end.date}T00:00:00+08:00"
-
-        for item in schedule_items:
-            item_start = item["start"]["dateTime"]
-            item_end = item["end"]["dateTime"]
-
-            # Check for time overlap
-            if (item_start <= input_end and item_end >= input_start):
-                if item["status"] == "BUSY":
-                    return "该时间段已有其他日程安排且状态为忙碌，请选择其他时间"
-
-    request_data = {
-        "summary": sets.summary,
-        "description": sets.description,
-        "isAllDay": sets.isAllDay,
-    }
-
-    if sets.isAllDay:
-        request_data["start"] = {"date": sets.start.date}
-        request_data["end"] = {"date": sets.end.date}
-    else:
-        request_data["start"] = {
-            "dateTime": sets.start.dateTime,
-            "timeZone": sets.start.timeZone
-        }
-        request_data["end"] = {
-            "dateTime": sets.end.dateTime,
-            "timeZone": sets.end.timeZone
-        }
+    input_start, input_end = _schedule_window(sets)
+    if _check_busy(client, input_start, input_end):
+        return "该时间段已有其他日程安排且状态为忙碌，请选择其他时间"
 
     try:
-        response = requests.post(
-            f"https://api.dingtalk.com/v1.0/calendar/users/{client.union_id}/calendars/primary/events",
-            headers={
-                "Content-Type": "application/json",
-                "x-acs-dingtalk-access-token": token
-            },
-            json=request_data
-        )
-        response.raise_for_status()
+        _create_event(client, sets)
         return f"成功创建日程：{sets.summary}"
     except requests.exceptions.RequestException as e:
-        error_message = str(e)
-        if hasattr(e.response, 'text'):
-            error_message += f"\nResponse: {e.response.text}"
-        print(f"Error details: {error_message}")
-        return f"创建日程失败：{error_message}"
+        return f"创建日程失败：{_error_message(e)}"
     
 @tool
 def SearchSchedule(search: ScheduleSearch) -> str:
@@ -248,40 +361,124 @@ Returns:
     str: 查询结果消息
 """
     client = DingTalkClient()
-    token = client.get_access_token()
+    mirror = get_calendar_mirror(client.union_id)
 
     try:
-        response = requests.get(
-            f"https://api.dingtalk.com/v1.0/calendar/users/{client.union_id}/calendars/primary/events",
-            params={
-                "timeMin": search.timeMin,
-                "timeMax": search.timeMax
-            },
-            headers={
-                "Content-Type": "application/json",
-                "x-acs-dingtalk-access-token": token
-            }
-        )
-        response.raise_for_status()
-        return response.json()
+        # 镜像在 CALENDAR_STALENESS 秒内同步过时直接本地查询，否则先拉取增量
+        mirror.sync(client)
+        if mirror.covers(search.timeMin, search.timeMax):
+            return {"events": mirror.search(search.timeMin, search.timeMax)}
+        # 有周期日程时按时间范围查询接口，由接口展开周期日程的实例
+        return {"events": mirror.fetch_range(client, search.timeMin, search.timeMax)}
     except requests.exceptions.RequestException as e:
         return f"查询日程失败：{str(e)}"
-    
-def FindPreciseOrder(orginrder: str, events: object) -> str:
-    """查找精确的指令"""
-    llm = ChatOpenAI(model=os.getenv("BASE_MODEL"))
+
+def _query_schedule(client: DingTalkClient, user_ids: List[str], start: str, end: str) -> dict:
+    response = client.request(
+        "POST",
+        f"/v1.0/calendar/users/{client.union_id}/querySchedule",
+        json={"userIds": user_ids, "startTime": start, "endTime": end}
+    )
+    return response.json()
+
+def _user_batches(user_ids: List[str]) -> List[List[str]]:
+    user_ids = list(dict.fromkeys(user_ids))
+    return [user_ids[i:i + SCHEDULE_QUERY_BATCH] for i in range(0, len(user_ids), SCHEDULE_QUERY_BATCH)]
+
+def _free_slot_message(query: FreeSlotQuery, availabilities: List[dict]) -> str:
+    window_start = parse_time({"dateTime": query.startTime})
+    window_end = parse_time({"dateTime": query.endTime})
+    intervals = [interval for availability in availabilities for interval in busy_intervals(availability)]
+    slots = free_slots(intervals, window_start, window_end, query.duration * 60, query.count)
+    if not slots:
+        return "该时间范围内没有所有参会人都空闲的时段"
+    return "所有参会人都空闲的时段：\n" + "\n".join(
+        f"{i}. {format_time(start)} 起可安排 {query.duration} 分钟（空闲至 {format_time(end)}）"
+        for i, (start, end) in enumerate(slots, 1)
+    )
+
+def _check_slot_query(query: FreeSlotQuery) -> Optional[str]:
+    if not query.userIds or query.duration <= 0:
+        return "请提供参会人和会议时长"
+    if parse_time({"dateTime": query.startTime}) is None or parse_time({"dateTime": query.endTime}) is None:
+        return "查找范围的时间格式有误"
+    return None
+
+@tool
+def FindFreeSlots(query: FreeSlotQuery) -> str:
+    """为多位参会人查找共同的空闲时段，安排会议前先用它找时间，再调用 SetSchedule 创建日程
+Args:
+    query: 参会人、会议时长和查找范围
+Returns:
+    str: 最早的几个共同空闲时段
+"""
+    error = _check_slot_query(query)
+    if error:
+        return error
+    client = DingTalkClient()
+    batches = _user_batches(query.userIds)
+    try:
+        # 参会人较多时分批并发查询忙闲
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            availabilities = list(executor.map(
+                lambda user_ids: _query_schedule(client, user_ids, query.startTime, query.endTime), batches
+            ))
+    except requests.exceptions.RequestException as e:
+        return f"查询忙闲失败：{_error_message(e)}"
+    return _free_slot_message(query, availabilities)
+
+def _find_precise_order_chain():
+    llm = get_chat_model(os.getenv("BASE_MODEL"))
     prompt = ChatPromptTemplate.from_messages([
         ("system", "请根据用户的输入和查询到的日程信息，提取出与用户输入最匹配的1个日程id以及是否为全天事件。注意查询到的数据结构为：{{'events': [{{'attendees': [], 'categories': [], 'createTime': '2023-09-26T08: 24: 18Z', 'description': '', 'end': '', 'extendedProperties': '', 'id': '', 'isAllDay': False, 'organizer': '', 'reminders': [], 'start': '', 'status': '', 'summary': 'xxxxxx', 'updateTime': ''}}]}} 日程id为events中的id字段，例如events[0]['id']，是否为全天事件字段为events中的isAllDay，例如events[0]['isAllDay']，有可能存在多个events项，你需要根据用户输入来匹配筛选，输出结构化数据，不要有其他输出。查询到的日程信息为：{events}"),
         ("human", "{input}")
     ])
+    parser = PydanticOutputParser(pydantic_object=EventsId)
+    prompt.partial_variables = {"format_instructions": parser.get_format_instructions()}
+    return prompt | llm | parser
+
+def FindPreciseOrder(orginrder: str, events: object) -> str:
+    """查找精确的指令"""
     try:
-        parser = PydanticOutputParser(pydantic_object=EventsId)
-        prompt.partial_variables = {"format_instructions": parser.get_format_instructions()}
-        chain = prompt | llm | parser
+        chain = _find_precise_order_chain()
         return chain.invoke({"input": orginrder, "events": events})
     except Exception as e:
         print(e)
         return None
+
+async def aFindPreciseOrder(orginrder: str, events: object) -> str:
+    """查找精确的指令（异步）"""
+    try:
+        chain = _find_precise_order_chain()
+        return await chain.ainvoke({"input": orginrder, "events": events})
+    except Exception as e:
+        print(e)
+        return None
+
+def _local_match(events: list, summary: str = None, description: str = None, start: dict = None, end: dict = None):
+    return match_event(events, summary, description, hint_window(start, end))
+
+def _modify_hints(search: ScheduleModify) -> dict:
+    """修改请求里的 summary/description/start/end 是修改后的新值，不能用来定位原日程，只用原标题、原描述和查询时间范围"""
+    return {
+        "summary": search.originalSummary,
+        "description": search.originalDescription,
+        "start": {"dateTime": search.timeMin},
+        "end": {"dateTime": search.timeMax},
+    }
+
+def _pick_event(orginrder: str, events: list, **hints) -> Optional[EventsId]:
+    """先用本地打分匹配，只有前几名分不出高下时才把这几个候选交给大模型"""
+    best, candidates = _local_match(events, **hints)
+    if best is not None:
+        return EventsId(id=best["id"], isAllDay=best.get("isAllDay", False))
+    return FindPreciseOrder(orginrder, [compact_event(event) for event in candidates])
+
+async def _apick_event(orginrder: str, events: list, **hints) -> Optional[EventsId]:
+    best, candidates = _local_match(events, **hints)
+    if best is not None:
+        return EventsId(id=best["id"], isAllDay=best.get("isAllDay", False))
+    return await aFindPreciseOrder(orginrder, [compact_event(event) for event in candidates])
     
 @tool
 def ModifySchedule(search: ScheduleModify) -> str:
@@ -312,74 +509,33 @@ Returns:
     if not events:
         return "您的日程空空如也"
     if len(events) > 1:
-        orginOrder = f"description: {search.description}, start: {search.start}, end: {search.end}, summary: {search.summary}"
-        returnID = FindPreciseOrder(orginOrder, events)
+        returnID = _pick_event(_modify_order(search), events, **_modify_hints(search))
         print(returnID)
-        eventid = returnID.id
-        isAllDay = returnID.id
-        if not eventid:
+        if not returnID or not returnID.id:
             return "您的日程似乎不存在，是否输入有误？"
+        eventid = returnID.id
+        isAllDay = returnID.isAllDay
     else:
         eventid = events[0]['id']
         isAllDay = events[0]['isAllDay']
 
     # 获取钉钉 API 客户端
     client = DingTalkClient()
-    token = client.get_access_token()
     print(eventid)
-    print(token)
 
     try:
-        request_data = {
-            "id": eventid
-        }
-        if search.summary:
-            request_data["summary"] = search.summary
-        if search.description:
-            request_data["description"] = search.description
-        if search.start:
-            if isAllDay:
-                request_data["start"] = {
-                    "date": search.start.date,
-                    "dateTime": search.start.dateTime,
-                    "timeZone": search.start.timeZone
-                }
-            else:
-                request_data["start"] = {
-                    "dateTime": search.start.dateTime,
-                    "timeZone": search.start.timeZone
-                }
-        if search.end:
-            if isAllDay:
-                request_data["end"] = {
-                    "date": search.end.date,
-                    "dateTime": search.end.dateTime,
-                    "timeZone": search.end.timeZone
-                }
-            else:
-                request_data["end"] = {
-                    "dateTime": search.end.dateTime,
-                    "timeZone": search.end.timeZone
-                }
-
+        request_data = _modify_payload(search, eventid, isAllDay)
         print("提交数据：")
         print(request_data)
-        response = requests.put(
-            f"https://api.dingtalk.com/v1.0/calendar/users/{client.union_id}/calendars/primary/events/{eventid}",
-            headers={
-                "Content-Type": "application/json",
-                "x-acs-dingtalk-access-token": token
-            },
+        response = client.request(
+            "PUT",
+            f"/v1.0/calendar/users/{client.union_id}/calendars/primary/events/{eventid}",
             json=request_data
         )
-        response.raise_for_status()
+        get_calendar_mirror(client.union_id).update(eventid, {**request_data, **_response_event(response)})
         return "成功修改日程"
     except requests.exceptions.RequestException as e:
-        error_message = str(e)
-        if hasattr(e.response, 'text'):
-            error_message += f"\nResponse: {e.response.text}"
-        print(f"Error details: {error_message}")
-        return f"创建日程失败：{error_message}"
+        return f"创建日程失败：{_error_message(e)}"
 
 @tool
 def DelSchedule(query: DeleteSchedule) -> str:
@@ -397,16 +553,17 @@ Returns:
     }
     # 使用 invoke 方法调用 SearchSchedule
     searchResult = SearchSchedule.invoke(search_dict)
+    if isinstance(searchResult, str):
+        return "查询日程失败"
     events = searchResult.get('events', [])
     if not events:
         return "您的日程空空如也"
     if len(events) > 1:
-        orginOder = f"description: {query.description}, summary: {query.summary}"
-        returnID = FindPreciseOrder(orginOder, events)
+        returnID = _pick_event(_delete_order(query), events, summary=query.summary, description=query.description)
         print(returnID)
-        eventid = returnID.id
-        if not eventid:
+        if not returnID or not returnID.id:
             return "您的日程似乎不存在，是否输入有误？"
+        eventid = returnID.id
     else:
         eventid = events[0]['id']
     print(f"要删除的日程ID: {eventid}")
@@ -423,20 +580,225 @@ Returns:
     print("要删除的日程ID:", query.eventid)
     # 获取钉钉 API 客户端
     client = DingTalkClient()
-    token = client.get_access_token()
     try:
-        response = requests.delete(
-            f"https://api.dingtalk.com/v1.0/calendar/users/{client.union_id}/calendars/primary/events/{query.eventid}?pushNotification=true",
-            headers={
-                "Content-Type": "application/json",
-                "x-acs-dingtalk-access-token": token
-            }
+        client.request(
+            "DELETE",
+            f"/v1.0/calendar/users/{client.union_id}/calendars/primary/events/{query.eventid}",
+            params={"pushNotification": "true"}
         )
-        response.raise_for_status()
+        get_calendar_mirror(client.union_id).remove(query.eventid)
         return "成功删除日程"
     except requests.exceptions.RequestException as e:
-        error_message = str(e)
-        if hasattr(e.response, 'text'):
-            error_message += f"\nResponse: {e.response.text}"
-        print(f"Error details: {error_message}")
-        return f"删除日程失败：{error_message}"
\ No newline at end of file
+        return f"删除日程失败：{_error_message(e)}"
+
+
+@tool
+def BatchCreateTodo(batch: TodoBatch) -> str:
+    """一次创建多个待办事项，用户一次提出多条待办时使用
+Args:
+    batch: 待办事项列表
+Returns:
+    str: 每一项的创建结果
+"""
+    client = DingTalkClient()
+
+    def create(todo):
+        client.request("POST", f"/v1.0/todo/users/{client.union_id}/tasks", json=_todo_payload(todo))
+
+    results = run_rate_limited(batch.todos, create)
+    return _batch_report("待办事项", [todo.subject for todo in batch.todos], results)
+
+@tool
+def BatchSetSchedule(batch: ScheduleBatch) -> str:
+    """一次创建多个日程，用户一次提出多条日程安排时使用
+Args:
+    batch: 日程列表
+Returns:
+    str: 每一项的创建结果
+"""
+    client = DingTalkClient()
+    schedules = batch.schedules
+    # 整批只查询一次忙闲，冲突项在本地剔除，限速调用里只剩创建请求本身
+    window = _batch_window(schedules)
+    availability = checkSchedule.invoke({
+        "schedule": ScheduleSchema(userIds=client.union_id, startTime=window[0], endTime=window[1]).model_dump()
+    }) if window else None
+    rejected = _batch_rejections(schedules, availability)
+
+    pending = [i for i in range(len(schedules)) if i not in rejected]
+    results = run_rate_limited([schedules[i] for i in pending], lambda sets: _create_event(client, sets))
+    results = _batch_results(len(schedules), rejected, dict(zip(pending, results)))
+    return _batch_report("日程", [sets.summary for sets in schedules], results)
+
+
+##### 异步工具实现
+# 在钉钉 Stream 事件循环中通过 ainvoke 调用工具时，使用下面的原生异步实现，
+# 不再阻塞事件循环；同步 invoke 仍走上面的实现。
+async def acreate_todo(todo: TodoInput) -> str:
+    client = AsyncDingTalkClient()
+    try:
+        await client.request(
+            "POST",
+            f"/v1.0/todo/users/{client.union_id}/tasks",
+            json=_todo_payload(todo)
+        )
+        return f"成功创建待办事项：{todo.subject}"
+    except httpx.HTTPError as e:
+        return f"创建待办事项失败：{str(e)}"
+
+async def acheckSchedule(schedule: ScheduleSchema) -> str:
+    client = AsyncDingTalkClient()
+    try:
+        response = await client.request(
+            "POST",
+            f"/v1.0/calendar/users/{client.union_id}/querySchedule",
+            json={
+                "userIds": [client.union_id],
+                "startTime": schedule.startTime,
+                "endTime": schedule.endTime
+            }
+        )
+        return response.json()
+    except httpx.HTTPError as e:
+        return f"查询日程失败：{str(e)}"
+
+async def aSetSchedule(sets: ScheduleSchemaSet) -> str:
+    client = AsyncDingTalkClient()
+    input_start, input_end = _schedule_window(sets)
+    if await _acheck_busy(client, input_start, input_end):
+        return "该时间段已有其他日程安排且状态为忙碌，请选择其他时间"
+
+    try:
+        await _acreate_event(client, sets)
+        return f"成功创建日程：{sets.summary}"
+    except httpx.HTTPError as e:
+        return f"创建日程失败：{_error_message(e)}"
+
+async def aSearchSchedule(search: ScheduleSearch) -> str:
+    client = AsyncDingTalkClient()
+    mirror = get_calendar_mirror(client.union_id)
+    try:
+        await mirror.async_sync(client)
+        if mirror.covers(search.timeMin, search.timeMax):
+            return {"events": mirror.search(search.timeMin, search.timeMax)}
+        return {"events": await mirror.afetch_range(client, search.timeMin, search.timeMax)}
+    except httpx.HTTPError as e:
+        return f"查询日程失败：{str(e)}"
+
+async def aFindFreeSlots(query: FreeSlotQuery) -> str:
+    error = _check_slot_query(query)
+    if error:
+        return error
+    client = AsyncDingTalkClient()
+
+    async def query_batch(user_ids):
+        response = await client.request(
+            "POST",
+            f"/v1.0/calendar/users/{client.union_id}/querySchedule",
+            json={"userIds": user_ids, "startTime": query.startTime, "endTime": query.endTime}
+        )
+        return response.json()
+
+    try:
+        availabilities = await asyncio.gather(*(query_batch(user_ids) for user_ids in _user_batches(query.userIds)))
+    except httpx.HTTPError as e:
+        return f"查询忙闲失败：{_error_message(e)}"
+    return _free_slot_message(query, availabilities)
+
+async def aModifySchedule(search: ScheduleModify) -> str:
+    searchResult = await aSearchSchedule(ScheduleSearch(timeMin=search.timeMin, timeMax=search.timeMax))
+    if isinstance(searchResult, str):
+        return "查询日程失败"
+
+    events = searchResult.get('events', [])
+    if not events:
+        return "您的日程空空如也"
+    if len(events) > 1:
+        returnID = await _apick_event(_modify_order(search), events, **_modify_hints(search))
+        if not returnID or not returnID.id:
+            return "您的日程似乎不存在，是否输入有误？"
+        eventid = returnID.id
+        isAllDay = returnID.isAllDay
+    else:
+        eventid = events[0]['id']
+        isAllDay = events[0]['isAllDay']
+
+    client = AsyncDingTalkClient()
+    try:
+        request_data = _modify_payload(search, eventid, isAllDay)
+        response = await client.request(
+            "PUT",
+            f"/v1.0/calendar/users/{client.union_id}/calendars/primary/events/{eventid}",
+            json=request_data
+        )
+        get_calendar_mirror(client.union_id).update(eventid, {**request_data, **_response_event(response)})
+        return "成功修改日程"
+    except httpx.HTTPError as e:
+        return f"创建日程失败：{_error_message(e)}"
+
+async def aDelSchedule(query: DeleteSchedule) -> str:
+    searchResult = await aSearchSchedule(ScheduleSearch())
+    if isinstance(searchResult, str):
+        return "查询日程失败"
+    events = searchResult.get('events', [])
+    if not events:
+        return "您的日程空空如也"
+    if len(events) > 1:
+        returnID = await _apick_event(_delete_order(query), events, summary=query.summary, description=query.description)
+        if not returnID or not returnID.id:
+            return "您的日程似乎不存在，是否输入有误？"
+        eventid = returnID.id
+    else:
+        eventid = events[0]['id']
+    return f"记录下日程id,然后询问用户，是否确认要删除日程 {eventid}"
+
+async def aConfirmDelSchedule(query: ScheduleDel) -> str:
+    client = AsyncDingTalkClient()
+    try:
+        await client.request(
+            "DELETE",
+            f"/v1.0/calendar/users/{client.union_id}/calendars/primary/events/{query.eventid}",
+            params={"pushNotification": "true"}
+        )
+        get_calendar_mirror(client.union_id).remove(query.eventid)
+        return "成功删除日程"
+    except httpx.HTTPError as e:
+        return f"删除日程失败：{_error_message(e)}"
+
+async def aBatchCreateTodo(batch: TodoBatch) -> str:
+    client = AsyncDingTalkClient()
+
+    async def create(todo):
+        await client.request("POST", f"/v1.0/todo/users/{client.union_id}/tasks", json=_todo_payload(todo))
+
+    results = await arun_rate_limited(batch.todos, create)
+    return _batch_report("待办事项", [todo.subject for todo in batch.todos], results)
+
+async def aBatchSetSchedule(batch: ScheduleBatch) -> str:
+    client = AsyncDingTalkClient()
+    schedules = batch.schedules
+    window = _batch_window(schedules)
+    availability = await acheckSchedule(
+        ScheduleSchema(userIds=client.union_id, startTime=window[0], endTime=window[1])
+    ) if window else None
+    rejected = _batch_rejections(schedules, availability)
+
+    pending = [i for i in range(len(schedules)) if i not in rejected]
+
+    async def create(sets):
+        await _acreate_event(client, sets)
+
+    results = await arun_rate_limited([schedules[i] for i in pending], create)
+    results = _batch_results(len(schedules), rejected, dict(zip(pending, results)))
+    return _batch_report("日程", [sets.summary for sets in schedules], results)
+
+create_todo.coroutine = acreate_todo
+checkSchedule.coroutine = acheckSchedule
+SetSchedule.coroutine = aSetSchedule
+SearchSchedule.coroutine = aSearchSchedule
+FindFreeSlots.coroutine = aFindFreeSlots
+ModifySchedule.coroutine = aModifySchedule
+DelSchedule.coroutine = aDelSchedule
+ConfirmDelSchedule.coroutine = aConfirmDelSchedule
+BatchCreateTodo.coroutine = aBatchCreateTodo
+BatchSetSchedule.coroutine = aBatchSetSchedule
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List
+from langchain_core.embeddings import Embeddings
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from langchain_openai import OpenAIEmbeddings
+from langchain_qdrant import QdrantVectorStore
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+# QDRANT_URL 为空时使用 PERSIST_DIR 下的本地磁盘库；设为 ":memory:" 使用内存库
+QDRANT_URL = os.getenv("QDRANT_URL", "")
+PERSIST_DIR = os.getenv("PERSIST_DIR", "./vector_db")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+# 向量缓存：内存 LRU 条数 / 本地磁盘库路径
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("data", "embeddings.db"))
+
+_lock = threading.Lock()
+_client = None
+_embeddings = None
+_stores = {}
+
+
+def get_qdrant_client() -> QdrantClient:
+    """进程内共享的 Qdrant 客户端（本地磁盘模式同一目录只能打开一次）"""
+    global _client
+    with _lock:
+        if _client is None:
+            if QDRANT_URL == ":memory:":
+                _client = QdrantClient(location=":memory:")
+            elif QDRANT_URL:
+                _client = QdrantClient(url=QDRANT_URL, api_key=os.getenv("QDRANT_API_KEY"))
+            else:
+                _client = QdrantClient(path=PERSIST_DIR)
+        return _client
+
+
+class CachedEmbeddings(Embeddings):
+    """按 hash(模型, 文本) 缓存向量：内存 LRU + 本地 SQLite，未命中的文本合并成一次请求"""
+    def __init__(self, embeddings: Embeddings, model: str = EMBEDDING_MODEL,
+                 path: str = EMBEDDING_CACHE_PATH, maxsize: int = EMBEDDING_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.model = model
+        self.path = path
+        self.maxsize = maxsize
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._memory = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: array):
+        with self._cache_lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        with self._cache_lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.stats["memory_hits"] += len(found)
+        missing = [key for key in keys if key not in found]
+        # SQLite 单条语句的参数数量有限，分批查询
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            rows = self._connect().execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f", blob)
+                found[key] = vector
+                self._remember(key, vector)
+            with self._cache_lock:
+                self.stats["disk_hits"] += len(rows)
+        return {key: vector.tolist() for key, vector in found.items()}
+
+    def _store(self, vectors: dict) -> dict:
+        """内存和磁盘统一保存 float32，返回值也按 float32 取整，命中与未命中时结果一致"""
+        items = {key: array("f", vector) for key, vector in vectors.items()}
+        for key, vector in items.items():
+            self._remember(key, vector)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in items.items()],
+            )
+        return {key: vector.tolist() for key, vector in items.items()}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        unique = dict(zip(keys, texts))
+        found = self._lookup(list(unique))
+        missing = [key for key in unique if key not in found]
+        if missing:
+            with self._cache_lock:
+                self.stats["misses"] += len(missing)
+            vectors = self.embeddings.embed_documents([unique[key] for key in missing])
+            found.update(self._store(dict(zip(missing, vectors))))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+        with self._cache_lock:
+            self.stats["misses"] += 1
+        return self._store({key: self.embeddings.embed_query(text)})[key]
+
+    def hit_rate(self) -> float:
+        with self._cache_lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+def get_embeddings() -> Embeddings:
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            _embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL))
+        return _embeddings
+
+
+def ensure_collection(collection_name: str, dim: int = EMBEDDING_DIM):
+    client = get_qdrant_client()
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+        )
+
+
+def get_vector_store(collection_name: str) -> QdrantVectorStore:
+    """按集合名缓存 QdrantVectorStore，集合不存在时自动创建"""
+    store = _stores.get(collection_name)
+    if store is None:
+        ensure_collection(collection_name)
+        store = QdrantVectorStore(
+            client=get_qdrant_client(),
+            collection_name=collection_name,
+            embedding=get_embeddings(),
+        )
+        with _lock:
+            store = _stores.setdefault(collection_name, store)
+    return store
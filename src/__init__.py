@@ -2,5 +2,19 @@ from .Agents import *
 from .Storage import *
 from .Prompt import *
 from .Emotion import *
+from .DingTalk import *
 from .Tools import *
-from .Memory import *
\ No newline at end of file
+from .Memory import *
+from .Models import *
+from .Logger import *
+from .RedisPool import *
+from .Codec import *
+from .Archive import *
+from .VectorStore import *
+from .Episodic import *
+from .Knowledge import *
+from .Ingest import *
+from .Search import *
+from .Matcher import *
+from .Calendar import *
+from .Slots import *
\ No newline at end of file
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture
+def memory_redis(monkeypatch):
+    """让 src.Memory 使用独立的 fakeredis 实例和空的会话缓存；折叠脚本和会话锁需要 fakeredis[lua]"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    import src.Memory as Memory
+
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    monkeypatch.setattr(Memory, "get_redis_client", lambda: client)
+    monkeypatch.setattr(Memory, "session_cache", Memory.SessionCache())
+    return client
@@ -0,0 +1,57 @@
+import os
+import time
+import tempfile
+from langchain_core.messages import AIMessage, HumanMessage
+import src.Memory as Memory
+from src.Archive import SessionArchive, pack_items, unpack_items
+from src.Memory import MemoryClass, RedisChatMessageHistory, archive_idle_sessions
+
+
+def test_pack_items():
+    items = [b"\x01abc", b"", b"{\"type\": \"human\"}"]
+    assert unpack_items(pack_items(items)) == items
+
+
+def test_session_archive():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SessionArchive(os.path.join(tmp, "sessions.db"))
+        archive.put("user1", [b"\x01new", b"\x01old"], "摘要", 42)
+        assert archive.count() == 1
+        assert archive.get("user1") == {"items": [b"\x01new", b"\x01old"], "summary": "摘要", "token_total": 42}
+        archive.delete("user1")
+        assert archive.get("user1") is None
+
+
+def test_archive_and_rehydrate(memory_redis, monkeypatch, tmp_path):
+    archive = SessionArchive(str(tmp_path / "sessions.db"))
+    monkeypatch.setattr(Memory, "get_session_archive", lambda: archive)
+    idle = RedisChatMessageHistory("idle", ttl=3600)
+    active = RedisChatMessageHistory("active", ttl=3600)
+    for history in (idle, active):
+        for message in (HumanMessage(content="你好"), AIMessage(content="喵")):
+            message.response_metadata["token_count"] = 5
+            history.add_message(message)
+    memory_redis.set(idle.summary_key, "之前聊过天气")
+    # idle 一天没有活动，active 刚刚活跃
+    memory_redis.zadd(Memory.SESSION_ACTIVITY_KEY, {"idle": time.time() - 86400})
+
+    assert archive_idle_sessions(idle_seconds=3600) == 1
+    assert not memory_redis.exists(idle.key, idle.summary_key, idle.tokens_key)
+    assert memory_redis.zscore(Memory.SESSION_ACTIVITY_KEY, "idle") is None
+    assert archive.count() == 1 and memory_redis.exists(active.key)
+
+    # 用户回来时从归档恢复：消息、摘要、token 计数和过期时间都还在
+    memory = MemoryClass.__new__(MemoryClass)
+    history = memory.get_memory("idle")
+    assert [m.content for m in history.window_messages] == ["你好", "喵"]
+    assert history.summary == "之前聊过天气"
+    assert history.token_total == 10
+    for key in (history.key, history.summary_key, history.tokens_key):
+        assert 0 < memory_redis.ttl(key) <= Memory.SESSION_TTL
+    assert memory_redis.zscore(Memory.SESSION_ACTIVITY_KEY, "idle") is not None
+    assert archive.count() == 0
+
+
+if __name__ == "__main__":
+    test_pack_items()
+    test_session_archive()
@@ -0,0 +1,79 @@
+import asyncio
+import src.DingTalk as DingTalk
+from src.DingTalk import AsyncDingTalkClient, AsyncPool, arun_rate_limited, is_throttled, run_rate_limited
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code, text=""):
+        super().__init__(f"HTTP {status_code}")
+        self.response = FakeResponse(status_code, text)
+
+
+def test_is_throttled():
+    assert is_throttled(FakeHTTPError(429))
+    assert is_throttled(FakeHTTPError(403, '{"code":"Forbidden.AccessDenied.QpsLimitForApi"}'))
+    assert not is_throttled(FakeHTTPError(400))
+    assert not is_throttled(ValueError("bad"))
+
+
+def test_run_rate_limited_retries_throttled(monkeypatch):
+    monkeypatch.setattr(DingTalk, "BATCH_BACKOFF", 0)
+    attempts = {}
+
+    def call(item):
+        attempts[item] = attempts.get(item, 0) + 1
+        if item == "slow" and attempts[item] < 3:
+            raise FakeHTTPError(429)
+        if item == "bad":
+            raise FakeHTTPError(400)
+        return item.upper()
+
+    results = run_rate_limited(["a", "slow", "bad"], call)
+    assert results[0] == (True, "A") and results[1] == (True, "SLOW")
+    assert results[2][0] is False and attempts["bad"] == 1
+    assert attempts["slow"] == 3
+
+
+def test_arun_rate_limited(monkeypatch):
+    monkeypatch.setattr(DingTalk, "BATCH_BACKOFF", 0)
+
+    async def call(item):
+        return item * 2
+
+    assert asyncio.run(arun_rate_limited([1, 2, 3], call)) == [(True, 2), (True, 4), (True, 6)]
+
+
+def test_async_pool_per_loop():
+    pool = AsyncPool()
+
+    async def use():
+        client = pool.client()
+        assert pool.client() is client
+        return client
+
+    async def use_and_close():
+        client = await use()
+        await pool.aclose()
+        assert client.is_closed
+        # 关闭后再次使用会创建新的客户端
+        assert pool.client() is not client
+        return client
+
+    first = asyncio.run(use())
+    second = asyncio.run(use_and_close())
+    # 每个事件循环使用自己的客户端，事件循环退出时客户端随之关闭
+    assert first is not second
+    assert first.is_closed and second.is_closed
+    assert len(pool._pools) == 0
+
+
+def test_async_client_keeps_sync_token_contract():
+    # 继承来的同步方法（如 get_union_id）调用 get_access_token 时必须拿到令牌而不是协程
+    assert not asyncio.iscoroutinefunction(AsyncDingTalkClient.get_access_token)
+    assert asyncio.iscoroutinefunction(AsyncDingTalkClient.aget_access_token)
@@ -0,0 +1,61 @@
+from src.Tools import ScheduleSchemaSet, _batch_conflicts, _batch_rejections, _batch_report, _batch_results, _batch_window
+
+
+def _schedule(summary, start, end):
+    return ScheduleSchemaSet(
+        summary=summary,
+        start={"date": "", "dateTime": start, "timeZone": "Asia/Shanghai"},
+        end={"date": "", "dateTime": end, "timeZone": "Asia/Shanghai"},
+        isAllDay=False,
+        description="",
+    )
+
+
+SCHEDULES = [
+    _schedule("周会", "2024-06-03T10:00:00+08:00", "2024-06-03T11:00:00+08:00"),
+    _schedule("评审", "2024-06-03T10:30:00+08:00", "2024-06-03T11:30:00+08:00"),
+    _schedule("分享", "2024-06-03T14:00:00+08:00", "2024-06-03T15:00:00+08:00"),
+    _schedule("复盘", "2024-06-03T16:00:00+08:00", "2024-06-03T17:00:00+08:00"),
+]
+
+AVAILABILITY = {"scheduleInformation": [{"scheduleItems": [
+    {"status": "BUSY", "start": {"dateTime": "2024-06-03T14:30:00+08:00"}, "end": {"dateTime": "2024-06-03T15:30:00+08:00"}},
+    {"status": "FREE", "start": {"dateTime": "2024-06-03T16:00:00+08:00"}, "end": {"dateTime": "2024-06-03T17:00:00+08:00"}},
+]}]}
+
+
+def test_batch_conflicts():
+    # 批次内重叠的日程只保留靠前的一项
+    assert _batch_conflicts(SCHEDULES) == {1: "与第 1 项日程时间冲突"}
+
+
+def test_batch_window():
+    assert _batch_window(SCHEDULES) == ("2024-06-03T10:00:00+08:00", "2024-06-03T17:00:00+08:00")
+    assert _batch_window([]) is None
+
+
+def test_batch_rejections():
+    rejected = _batch_rejections(SCHEDULES, AVAILABILITY)
+    assert sorted(rejected) == [1, 2]
+    assert "忙碌" in rejected[2]
+    # 忙闲查询失败时只剔除批次内的冲突
+    assert sorted(_batch_rejections(SCHEDULES, "查询日程失败")) == [1]
+
+
+def test_batch_report():
+    rejected = {1: "与第 1 项日程时间冲突"}
+    results = _batch_results(3, rejected, {0: (True, None), 2: (False, RuntimeError("网络错误"))})
+    report = _batch_report("日程", ["周会", "评审", "分享"], results)
+    assert report.splitlines() == [
+        "共 3 个日程，成功 1 个，失败 2 个",
+        "1. 周会：成功",
+        "2. 评审：失败，与第 1 项日程时间冲突",
+        "3. 分享：失败，网络错误",
+    ]
+
+
+if __name__ == "__main__":
+    test_batch_conflicts()
+    test_batch_window()
+    test_batch_rejections()
+    test_batch_report()
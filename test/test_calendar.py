@@ -0,0 +1,141 @@
+import time
+import threading
+import pytest
+import requests
+from src.Calendar import CalendarMirror, IntervalIndex
+
+
+def _event(event_id, start, end, **extra):
+    return {"id": event_id, "summary": event_id, "start": {"dateTime": start}, "end": {"dateTime": end}, **extra}
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200, text=""):
+        self.data = data
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return self.data
+
+
+class FakeClient:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def request(self, method, path, params=None, **kwargs):
+        self.calls.append(dict(params))
+        page = self.pages.pop(0)
+        if isinstance(page, Exception):
+            raise page
+        return FakeResponse(page)
+
+
+def test_interval_index():
+    index = IntervalIndex()
+    index.add(0, 100, "long")
+    index.add(10, 20, "a")
+    index.add(30, 40, "b")
+    assert sorted(index.overlapping(15, 35)) == ["a", "b", "long"]
+    assert index.overlapping(20, 30) == ["long"]
+    assert index.starting_between(10, 30) == ["a", "b"]
+    index.remove(10, 20, "a")
+    assert sorted(index.overlapping(15, 35)) == ["b", "long"]
+
+
+def test_incremental_sync_and_write_through():
+    client = FakeClient([
+        {"events": [_event("1", "2024-06-03T10:00:00+08:00", "2024-06-03T11:00:00+08:00")], "nextToken": "p2"},
+        {"events": [_event("2", "2024-06-04T10:00:00+08:00", "2024-06-04T11:00:00+08:00")], "syncToken": "s1"},
+        {"events": [{"id": "1", "status": "cancelled"}], "syncToken": "s2"},
+    ])
+    mirror = CalendarMirror("u1", staleness=60)
+    mirror.sync(client)
+    assert len(mirror) == 2 and mirror.sync_token == "s1"
+    assert [event["id"] for event in mirror.overlapping("2024-06-03T10:30:00+08:00", "2024-06-03T12:00:00+08:00")] == ["1"]
+    assert not mirror.overlapping("2024-06-03T11:00:00+08:00", "2024-06-03T12:00:00+08:00")
+
+    # 未过期时不访问接口
+    mirror.sync(client)
+    assert len(client.calls) == 2
+
+    mirror.sync(client, force=True)
+    assert client.calls[-1]["syncToken"] == "s1"
+    assert [event["id"] for event in mirror.search()] == ["2"]
+
+    mirror.upsert(_event("3", "2024-06-05T09:00:00+08:00", "2024-06-05T10:00:00+08:00"))
+    mirror.update("3", {"summary": "改期", "start": {"dateTime": "2024-06-06T09:00:00+08:00"},
+                        "end": {"dateTime": "2024-06-06T10:00:00+08:00"}})
+    assert [event["summary"] for event in mirror.search("2024-06-06T00:00:00+08:00")] == ["改期"]
+    mirror.remove("3")
+    assert not mirror.overlapping("2024-06-06T09:00:00+08:00", "2024-06-06T10:00:00+08:00")
+
+
+def test_invalid_sync_token_falls_back_to_full_sync():
+    expired = requests.exceptions.HTTPError(response=FakeResponse(None, 410, "syncToken expired"))
+    client = FakeClient([
+        {"events": [_event("1", "2024-06-03T10:00:00+08:00", "2024-06-03T11:00:00+08:00")], "syncToken": "s1"},
+        expired,
+        {"events": [_event("2", "2024-06-04T10:00:00+08:00", "2024-06-04T11:00:00+08:00")], "syncToken": "s2"},
+    ])
+    mirror = CalendarMirror("u1")
+    mirror.sync(client)
+    mirror.sync(client, force=True)
+    assert "syncToken" not in client.calls[-1]
+    assert [event["id"] for event in mirror.search()] == ["2"] and mirror.sync_token == "s2"
+
+
+def test_other_errors_are_not_swallowed():
+    client = FakeClient([
+        {"events": [], "syncToken": "s1"},
+        requests.exceptions.HTTPError(response=FakeResponse(None, 500, "server error")),
+        KeyError("bug"),
+    ])
+    mirror = CalendarMirror("u1")
+    mirror.sync(client)
+    with pytest.raises(requests.exceptions.HTTPError):
+        mirror.sync(client, force=True)
+    with pytest.raises(KeyError):
+        mirror.sync(client, force=True)
+    assert mirror.sync_token == "s1"
+
+
+def test_search_returns_copies():
+    mirror = CalendarMirror("u1")
+    mirror.upsert(_event("1", "2024-06-03T10:00:00+08:00", "2024-06-03T11:00:00+08:00"))
+    mirror.search()[0]["start"]["dateTime"] = "2030-01-01T00:00:00+08:00"
+    assert mirror.search()[0]["start"]["dateTime"] == "2024-06-03T10:00:00+08:00"
+
+
+def test_recurring_events_fall_back_to_api():
+    master = _event("r", "2024-01-01T09:00:00+08:00", "2024-01-01T09:30:00+08:00", recurrence={"pattern": {"type": "daily"}})
+    instance = _event("r_20240603", "2024-06-03T09:00:00+08:00", "2024-06-03T09:30:00+08:00")
+    client = FakeClient([{"events": [master], "syncToken": "s1"}, {"events": [instance]}])
+    mirror = CalendarMirror("u1")
+    mirror.sync(client)
+    # 不限时间范围时镜像可以回答；按时间范围查询时周期日程需要接口展开
+    assert mirror.covers()
+    assert not mirror.covers("2024-06-03T00:00:00+08:00", "2024-06-04T00:00:00+08:00")
+    events = mirror.fetch_range(client, "2024-06-03T00:00:00+08:00", "2024-06-04T00:00:00+08:00")
+    assert [event["id"] for event in events] == ["r_20240603"]
+    assert client.calls[-1]["timeMin"] == "2024-06-03T00:00:00+08:00" and "syncToken" not in client.calls[-1]
+
+    mirror.remove("r")
+    assert mirror.covers("2024-06-03T00:00:00+08:00", "2024-06-04T00:00:00+08:00")
+
+
+def test_concurrent_sync_fetches_once():
+    class SlowClient(FakeClient):
+        def request(self, method, path, params=None, **kwargs):
+            time.sleep(0.05)
+            return super().request(method, path, params=params, **kwargs)
+
+    client = SlowClient([{"events": [], "syncToken": "s1"}, {"events": [], "syncToken": "s2"}])
+    mirror = CalendarMirror("u1")
+    threads = [threading.Thread(target=mirror.sync, args=(client,)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(client.calls) == 1 and mirror.sync_token == "s1"
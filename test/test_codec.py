@@ -0,0 +1,36 @@
+import json
+from langchain_core.messages import HumanMessage, AIMessage, message_to_dict
+from src.Codec import encode_record, decode_record, encode_message, decode_messages
+
+
+def test_codec_roundtrip():
+    messages = [
+        HumanMessage(content="你好，我是小明！" * 50),
+        AIMessage(content="你好呀", id="run-1"),
+    ]
+    messages[0].response_metadata["token_count"] = 400
+    encoded = [encode_message(m) for m in messages]
+    decoded = decode_messages(encoded)
+    assert decoded == messages
+    assert decoded[0].response_metadata["token_count"] == 400
+
+    record = message_to_dict(messages[0])
+    assert len(encode_record(record)) < len(json.dumps(record))
+
+
+def test_codec_reads_legacy_json():
+    record = message_to_dict(AIMessage(content="旧数据"))
+    assert decode_record(json.dumps(record).encode("utf-8"))["data"]["content"] == "旧数据"
+
+
+def test_codec_keeps_zero_values():
+    record = {"type": "ai", "data": {"content": "x", "count": 0, "ratio": 0.0, "example": False, "name": None}}
+    data = decode_record(encode_record(record))["data"]
+    assert data["count"] == 0 and data["ratio"] == 0.0
+    assert "example" not in data and "name" not in data
+
+
+if __name__ == "__main__":
+    test_codec_roundtrip()
+    test_codec_reads_legacy_json()
+    test_codec_keeps_zero_values()
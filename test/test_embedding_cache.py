@@ -0,0 +1,53 @@
+import os
+import tempfile
+from src.VectorStore import CachedEmbeddings
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 0.5]
+
+
+def test_cached_embeddings():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "embeddings.db")
+        fake = FakeEmbeddings()
+        cache = CachedEmbeddings(fake, model="test", path=path, maxsize=2)
+        assert cache.embed_documents(["a", "bb", "a"]) == [[1.0, 0.5], [2.0, 0.5], [1.0, 0.5]]
+        # 未命中的文本合并为一次请求
+        assert cache.embed_documents(["a", "bb", "ccc"])[2] == [3.0, 0.5]
+        assert fake.calls == [["a", "bb"], ["ccc"]]
+
+        # 新实例从磁盘读取，不再请求
+        reopened = CachedEmbeddings(fake, model="test", path=path)
+        assert reopened.embed_query("bb") == [2.0, 0.5]
+        assert len(fake.calls) == 2
+        assert reopened.hit_rate() == 1.0
+
+
+def test_memory_and_disk_use_float32():
+    class PreciseEmbeddings(FakeEmbeddings):
+        def embed_query(self, text):
+            return [0.1, 1 / 3]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "embeddings.db")
+        cache = CachedEmbeddings(PreciseEmbeddings(), model="test", path=path)
+        computed = cache.embed_query("q")
+        # 未命中、内存命中和磁盘命中返回相同的向量
+        assert cache.embed_query("q") == computed
+        assert CachedEmbeddings(PreciseEmbeddings(), model="test", path=path).embed_query("q") == computed
+        assert computed != [0.1, 1 / 3]
+
+
+if __name__ == "__main__":
+    test_cached_embeddings()
+    test_memory_and_disk_use_float32()
@@ -0,0 +1,93 @@
+from src.Emotion import EmotionClass, LexiconEmotionClassifier, EMOTION_FAST_THRESHOLD
+
+
+def test_lexicon_classifier():
+    classifier = LexiconEmotionClassifier()
+
+    result, confidence = classifier.classify("好的")
+    assert result == {"feeling": "default", "score": "5"}
+    assert confidence == 1.0
+
+    result, confidence = classifier.classify("谢谢，辛苦了!")
+    assert result["feeling"] == "friendly"
+    assert confidence > EMOTION_FAST_THRESHOLD
+
+    # 否定和混合情绪交给 LLM
+    assert classifier.classify("我将别生气!") == (None, 0.0)
+    assert classifier.classify("哈哈 谢谢")[0] is None
+    assert classifier.classify("随便吧，能接受")[0] is None
+
+
+def test_single_hit_below_threshold():
+    classifier = LexiconEmotionClassifier()
+    result, confidence = classifier.classify("谢谢你的帮助!")
+    assert result["feeling"] == "friendly"
+    assert confidence < EMOTION_FAST_THRESHOLD
+
+
+def test_negation_before_keyword():
+    classifier = LexiconEmotionClassifier()
+    assert classifier.classify("我没有生气") == (None, 0.0)
+    assert classifier.classify("一点都不开心") == (None, 0.0)
+    # 否定词在另一个短句里不影响
+    result, _ = classifier.classify("没事，气死我了，我很生气")
+    assert result["feeling"] == "angry"
+
+
+def test_standalone_keywords():
+    classifier = LexiconEmotionClassifier()
+    # “滚动”“你好烦”不是对应的情绪
+    assert classifier.classify("页面滚动很卡")[0] is None
+    assert classifier.classify("你好烦")[0] is None
+    result, _ = classifier.classify("你好，请问会议室在哪")
+    assert result["feeling"] == "friendly"
+    result, _ = classifier.classify("滚！气死了")
+    assert result["feeling"] == "angry"
+
+
+class FakeChain:
+    def __init__(self):
+        self.inputs = []
+
+    def invoke(self, inputs):
+        self.inputs.append(inputs["input"])
+        return {"feeling": "default", "score": "5"}
+
+
+def _emotion_class():
+    emotion = EmotionClass.__new__(EmotionClass)
+    emotion.threshold = EMOTION_FAST_THRESHOLD
+    emotion.fast_classifier = LexiconEmotionClassifier()
+    emotion.chain = FakeChain()
+    return emotion
+
+
+def test_short_messages_use_fast_path():
+    emotion = _emotion_class()
+    for text in ["谢谢", "thanks", "谢谢你", "Thank you!", "您好", "好生气！"]:
+        assert emotion.emotion_sensing(text) is not None
+    assert emotion.chain.inputs == []
+    assert emotion.emotion_sensing("谢谢")["feeling"] == "friendly"
+    assert emotion.emotion_sensing("好生气！")["feeling"] == "angry"
+
+
+def test_emotion_sensing_batch_dedup_and_order():
+    emotion = _emotion_class()
+
+    texts = ["明天开会", "好的", ["列表"], "明天开会", None, 42, "42"]
+    results = emotion.emotion_sensing_batch(texts)
+    assert [r["input"] for r in results] == texts
+    # 相同输入只调用一次 LLM，不可哈希的输入按字符串处理
+    assert sorted(emotion.chain.inputs) == sorted(["明天开会", "['列表']", "42"])
+    assert results[1]["emotion"] == {"feeling": "default", "score": "5"}
+    assert results[4]["emotion"] is None and results[4]["error"] == "输入为空"
+    assert results[5]["emotion"] == results[6]["emotion"]
+
+
+if __name__ == "__main__":
+    test_lexicon_classifier()
+    test_single_hit_below_threshold()
+    test_negation_before_keyword()
+    test_standalone_keywords()
+    test_short_messages_use_fast_path()
+    test_emotion_sensing_batch_dedup_and_order()
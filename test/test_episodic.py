@@ -0,0 +1,53 @@
+import threading
+from types import SimpleNamespace
+from src.Episodic import EpisodicMemory
+
+
+class FakeStore:
+    def __init__(self, results=None):
+        self.results = results or []
+        self.added = []
+        self.searches = []
+        self.flushed = threading.Event()
+
+    def add_texts(self, texts, metadatas=None):
+        self.added.append((texts, metadatas))
+        self.flushed.set()
+
+    def similarity_search_with_score(self, query, k=4, filter=None):
+        self.searches.append((query, k))
+        if isinstance(self.results, Exception):
+            raise self.results
+        return self.results
+
+
+def test_remember_batches_in_background():
+    store = FakeStore()
+    memory = EpisodicMemory(store=store, batch_size=2, flush_seconds=5)
+    memory.remember("s1", "", "")
+    memory.remember("s1", "明天开会", "好的")
+    memory.remember("s2", "你好", "你好呀")
+    assert store.flushed.wait(2)
+
+    texts, metadatas = store.added[0]
+    assert texts == ["user: 明天开会\n魔法猫猫: 好的", "user: 你好\n魔法猫猫: 你好呀"]
+    assert [m["session_id"] for m in metadatas] == ["s1", "s2"]
+
+
+def test_recall_filters_by_score():
+    doc = lambda content: SimpleNamespace(page_content=content)
+    store = FakeStore([(doc("相关"), 0.9), (doc("无关"), 0.3)])
+    memory = EpisodicMemory(store=store, top_k=2, score_threshold=0.75)
+    assert memory.recall("s1", "开会") == ["相关"]
+    assert store.searches == [("开会", 2)]
+
+
+def test_recall_error_returns_empty():
+    memory = EpisodicMemory(store=FakeStore(RuntimeError("qdrant down")))
+    assert memory.recall("s1", "开会") == []
+
+
+if __name__ == "__main__":
+    test_remember_batches_in_background()
+    test_recall_filters_by_score()
+    test_recall_error_returns_empty()
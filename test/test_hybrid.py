@@ -0,0 +1,70 @@
+import os
+import asyncio
+import tempfile
+from langchain_core.documents import Document
+import src.Tools as Tools
+from src.Knowledge import SparseIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize():
+    tokens = tokenize("调用 RunnableLambda.batch 报错")
+    assert "runnablelambda.batch" in tokens and "batch" in tokens
+    assert tokens[:1] == ["调用"]
+    assert "报错" in tokens
+
+
+def test_sparse_index_incremental():
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SparseIndex(os.path.join(tmp, "bm25.db"))
+        index.add(
+            ["1", "2", "3"],
+            ["使用 ChatOpenAI 创建模型", "InMemoryRateLimiter 限制请求速率", "向量数据库 Qdrant 的使用"],
+            [{"source": "a"}, {"source": "b"}, {"source": "c"}],
+        )
+        results = index.search("InMemoryRateLimiter 怎么用", k=2)
+        assert results[0].metadata == {"source": "b", "_id": "2"}
+
+        index.delete(["2"])
+        assert all(doc.metadata["_id"] != "2" for doc in index.search("InMemoryRateLimiter"))
+
+        # 其他连接（入库任务）的写入也能被感知
+        SparseIndex(index.path).add(["4"], ["InMemoryRateLimiter 的参数"], [{"source": "d"}])
+        assert index.search("InMemoryRateLimiter")[0].metadata["_id"] == "4"
+
+
+def test_reciprocal_rank_fusion():
+    a, b, c = (Document(page_content=t, metadata={"_id": t}) for t in "abc")
+    fused = reciprocal_rank_fusion([[a, b, c], [b, c]], top_n=2)
+    assert [doc.page_content for doc in fused] == ["b", "c"]
+
+
+class FakeRetriever:
+    """记录同步/异步调用，返回固定文档"""
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def invoke(self, query):
+        self.calls.append(("sync", query))
+        return self.docs
+
+    async def ainvoke(self, query):
+        self.calls.append(("async", query))
+        return self.docs
+
+
+def test_get_info_from_local(monkeypatch):
+    retriever = FakeRetriever([
+        Document(page_content="RunnableLambda 把函数包装成 Runnable", metadata={"source": "runnables.md"}),
+        Document(page_content="batch 可以并发执行", metadata={}),
+    ])
+    monkeypatch.setattr(Tools, "get_knowledge_retriever", lambda: retriever)
+    expected = "[runnables.md]\nRunnableLambda 把函数包装成 Runnable\n\n[知识库]\nbatch 可以并发执行"
+
+    assert Tools.get_info_from_local.invoke({"query": "RunnableLambda"}) == expected
+    # 异步调用走检索器的 ainvoke，不在事件循环里同步检索
+    assert asyncio.run(Tools.get_info_from_local.ainvoke({"query": "batch"})) == expected
+    assert retriever.calls == [("sync", "RunnableLambda"), ("async", "batch")]
+
+    retriever.docs = []
+    assert Tools.get_info_from_local.invoke({"query": "无关"}) == "本地知识库中没有找到相关内容"
@@ -0,0 +1,73 @@
+import os
+import tempfile
+from src.Ingest import IngestPipeline, Manifest
+from src.Knowledge import SparseIndex
+
+
+class FakeStore:
+    def __init__(self):
+        self.points = {}
+        self.batches = []
+
+    def add_texts(self, texts, metadatas=None, ids=None, batch_size=64):
+        self.batches.append(len(texts))
+        for text, metadata, point_id in zip(texts, metadatas, ids):
+            self.points[point_id] = (text, metadata)
+
+    def delete(self, ids=None):
+        for point_id in ids:
+            self.points.pop(point_id, None)
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_incremental_ingest():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = os.path.join(tmp, "docs")
+        os.makedirs(docs)
+        _write(os.path.join(docs, "a.txt"), "魔法猫猫的知识库 " * 200)
+        _write(os.path.join(docs, "b.md"), "# 日程\n每周一开例会")
+        manifest_path = os.path.join(tmp, "manifest.json")
+        store = FakeStore()
+        sparse = SparseIndex(os.path.join(tmp, "bm25.db"))
+
+        report = IngestPipeline(store, Manifest(manifest_path), batch_size=2, workers=1, sparse=sparse).run(docs)
+        assert report["indexed"] == 2 and report["skipped"] == 0
+        assert max(store.batches) <= 2
+        total = len(store.points)
+        assert total == report["chunks"] == sparse.count()
+
+        # 未变化的文件直接跳过
+        report = IngestPipeline(store, Manifest(manifest_path), batch_size=2, workers=1, sparse=sparse).run(docs)
+        assert report["skipped"] == 2 and report["chunks"] == 0
+
+        # 修改的文件替换旧向量，删除的文件移除向量
+        _write(os.path.join(docs, "b.md"), "# 日程\n每周二开例会")
+        os.remove(os.path.join(docs, "a.txt"))
+        report = IngestPipeline(store, Manifest(manifest_path), batch_size=2, workers=1, sparse=sparse).run(docs)
+        assert report["indexed"] == 1 and report["removed"] == 1
+        assert [text for text, _ in store.points.values()] == ["# 日程\n每周二开例会"]
+        assert list(Manifest(manifest_path).files) == [os.path.join(docs, "b.md")]
+        assert sparse.count() == 1
+
+
+def test_sibling_roots_are_independent():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, docs2 = os.path.join(tmp, "docs"), os.path.join(tmp, "docs2")
+        os.makedirs(docs)
+        os.makedirs(docs2)
+        _write(os.path.join(docs, "a.txt"), "第一个目录")
+        _write(os.path.join(docs2, "b.txt"), "第二个目录")
+        manifest_path = os.path.join(tmp, "manifest.json")
+        store = FakeStore()
+        sparse = SparseIndex(os.path.join(tmp, "bm25.db"))
+
+        IngestPipeline(store, Manifest(manifest_path), workers=1, sparse=sparse).run(docs2)
+        # 入库 docs 时不能把 docs2 的文件当成已删除
+        report = IngestPipeline(store, Manifest(manifest_path), workers=1, sparse=sparse).run(docs)
+        assert report["removed"] == 0
+        assert sorted(Manifest(manifest_path).files) == [os.path.join(docs, "a.txt"), os.path.join(docs2, "b.txt")]
+        assert len(store.points) == sparse.count() == 2
@@ -0,0 +1,29 @@
+import logging
+from src.Logger import ContextFilter, log_context, log_stage
+
+
+def _record():
+    record = logging.LogRecord("MagicCat", logging.INFO, __file__, 0, "hello", None, None)
+    ContextFilter().filter(record)
+    return record
+
+
+def test_log_context():
+    record = _record()
+    assert record.session_id == "-"
+    assert record.latency == ""
+
+    with log_context(session_id="user1", message_id="msg1"):
+        with log_stage("parse"):
+            pass
+        record = _record()
+        assert record.session_id == "user1"
+        assert record.message_id == "msg1"
+        assert "parse" in record.latencies
+        assert "parse=" in record.latency
+
+    assert _record().session_id == "-"
+
+
+if __name__ == "__main__":
+    test_log_context()
@@ -0,0 +1,42 @@
+from src.Matcher import hint_window, match_event, text_similarity
+
+EVENTS = [
+    {"id": "1", "summary": "产品周会", "description": "", "isAllDay": False,
+     "start": {"dateTime": "2024-06-03T10:00:00+08:00"}, "end": {"dateTime": "2024-06-03T11:00:00+08:00"}},
+    {"id": "2", "summary": "技术分享", "description": "LangChain Agent", "isAllDay": False,
+     "start": {"dateTime": "2024-06-04T14:00:00+08:00"}, "end": {"dateTime": "2024-06-04T15:00:00+08:00"}},
+    {"id": "3", "summary": "技术分享", "description": "Qdrant 入门", "isAllDay": False,
+     "start": {"dateTime": "2024-06-05T14:00:00+08:00"}, "end": {"dateTime": "2024-06-05T15:00:00+08:00"}},
+    {"id": "4", "summary": "团建", "description": "", "isAllDay": True,
+     "start": {"date": "2024-06-07"}, "end": {"date": "2024-06-08"}},
+]
+
+
+def test_text_similarity():
+    assert text_similarity("周会", "产品周会") > 0.9
+    assert text_similarity("周会", "团建") == 0.0
+
+
+def test_clear_winner_is_local():
+    best, _ = match_event(EVENTS, summary="周会")
+    assert best["id"] == "1"
+    best, _ = match_event(EVENTS, summary="团建")
+    assert best["id"] == "4" and best["isAllDay"]
+
+
+def test_time_hint_breaks_tie():
+    window = hint_window({"dateTime": "2024-06-05T14:00:00+08:00"}, {"dateTime": "2024-06-05T15:00:00+08:00"})
+    best, _ = match_event(EVENTS, summary="技术分享", window=window)
+    assert best["id"] == "3"
+
+
+def test_real_tie_returns_top_candidates():
+    best, candidates = match_event(EVENTS, summary="技术分享", candidates=2)
+    assert best is None
+    assert sorted(event["id"] for event in candidates) == ["2", "3"]
+
+
+def test_no_signal_keeps_all_candidates():
+    # 没有任何匹配线索时不能只截取前几个交给大模型
+    best, candidates = match_event(EVENTS + EVENTS, candidates=2)
+    assert best is None and len(candidates) == 8
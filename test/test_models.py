@@ -0,0 +1,28 @@
+import asyncio
+import httpx
+from src.Models import LoopBoundAsyncClient, _freeze
+
+
+def test_freeze_unhashable_kwargs():
+    first = _freeze({"temperature": 0, "model_kwargs": {"stop": ["\n"]}, "tags": {"a", "b"}})
+    second = _freeze({"tags": {"b", "a"}, "model_kwargs": {"stop": ["\n"]}, "temperature": 0})
+    assert first == second
+    assert hash(first) == hash(second)
+
+
+def test_async_client_per_loop():
+    client = LoopBoundAsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+
+    async def call():
+        response = await client.get("http://test/")
+        assert response.status_code == 200
+        return client._current()
+
+    first = asyncio.run(call())
+    second = asyncio.run(call())
+    assert first is not second
+
+
+if __name__ == "__main__":
+    test_freeze_unhashable_kwargs()
+    test_async_client_per_loop()
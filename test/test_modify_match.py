@@ -0,0 +1,44 @@
+import src.Tools as Tools
+from src.Tools import ScheduleModify, _local_match, _modify_hints, _pick_event
+
+EVENTS = [
+    {"id": "a", "summary": "产品周会", "description": "", "isAllDay": False,
+     "start": {"dateTime": "2024-06-03T10:00:00+08:00"}, "end": {"dateTime": "2024-06-03T11:00:00+08:00"}},
+    {"id": "b", "summary": "技术分享", "description": "", "isAllDay": False,
+     "start": {"dateTime": "2024-06-04T14:00:00+08:00"}, "end": {"dateTime": "2024-06-04T15:00:00+08:00"}},
+]
+
+NEW_SLOT = {
+    "start": {"date": "", "dateTime": "2024-06-04T14:00:00+08:00", "timeZone": "Asia/Shanghai"},
+    "end": {"date": "", "dateTime": "2024-06-04T15:00:00+08:00", "timeZone": "Asia/Shanghai"},
+}
+
+
+def test_new_slot_is_not_a_match_hint():
+    # 把周会改到和技术分享重叠的时间段，新时间和新标题不能把技术分享选中
+    search = ScheduleModify(originalSummary="产品周会", summary="技术分享预演", **NEW_SLOT)
+    best, _ = _local_match(EVENTS, **_modify_hints(search))
+    assert best["id"] == "a"
+
+
+def test_new_description_is_not_a_match_hint():
+    events = [dict(EVENTS[0], description="讨论需求"), dict(EVENTS[1], description="")]
+    # 新描述写的是技术分享的内容，不能据此把技术分享选中
+    search = ScheduleModify(originalDescription="讨论需求", description="技术分享", **NEW_SLOT)
+    assert _modify_hints(search)["description"] == "讨论需求"
+    best, _ = _local_match(events, **_modify_hints(search))
+    assert best["id"] == "a"
+
+
+def test_without_original_summary_falls_back_to_llm():
+    search = ScheduleModify(summary="技术分享", **NEW_SLOT)
+    best, candidates = _local_match(EVENTS, **_modify_hints(search))
+    assert best is None and len(candidates) == 2
+
+
+def test_no_hints_sends_every_event_to_llm(monkeypatch):
+    sent = []
+    monkeypatch.setattr(Tools, "FindPreciseOrder", lambda order, events: sent.extend(events))
+    events = [dict(EVENTS[0], id=f"e{i}", summary=f"会议{i}") for i in range(6)]
+    _pick_event("把会议改到明天", events, **_modify_hints(ScheduleModify(summary="新会议")))
+    assert [event["id"] for event in sent] == [f"e{i}" for i in range(6)]
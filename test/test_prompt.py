@@ -0,0 +1,16 @@
+from src.Prompt import PromptClass, get_prompt, MOODS
+
+
+def test_prompt_cache():
+    # 相同的 (情绪, 记忆键, 分值) 复用同一个已编译模板
+    assert get_prompt("angry", "chat_history", "8") is get_prompt("angry", "chat_history", 8)
+    # 未知情绪回退到 default
+    assert get_prompt("unknown") is get_prompt("default")
+
+    prompt = PromptClass(feeling={"feeling": "friendly", "score": 1}).prompt_structure()
+    assert prompt.partial_variables["who_you_are"] == MOODS["friendly"]["roloSet"]
+    assert prompt.partial_variables["feelScore"] == 1
+
+
+if __name__ == "__main__":
+    test_prompt_cache()
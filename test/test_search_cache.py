@@ -0,0 +1,52 @@
+import time
+import threading
+from src.Search import SearchCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  今天天气如何？") == normalize_query("今天天气如何") == "今天天气如何"
+    assert normalize_query("LangChain   Agent!") == "langchain agent"
+
+
+def test_ttl_and_single_flight():
+    calls = []
+    gate = threading.Event()
+
+    def fetch(query):
+        calls.append(query)
+        gate.wait(1)
+        return f"result {len(calls)}"
+
+    cache = SearchCache(fetch, ttl=60, stale_ttl=0, stale_while_revalidate=False)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("今天天气如何？"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["result 1"] * 5 and len(calls) == 1
+    assert cache.get("今天天气如何") == "result 1"
+    stats = cache.get_stats()
+    assert stats["misses"] == 1 and stats["deduplicated"] == 4 and stats["hits"] == 1
+
+
+def test_stale_while_revalidate():
+    calls = []
+
+    def fetch(query):
+        calls.append(query)
+        return f"result {len(calls)}"
+
+    cache = SearchCache(fetch, ttl=0, stale_ttl=60, stale_while_revalidate=True)
+    assert cache.get("LangChain 天气？") == "result 1"
+    # 过期后立即返回旧结果，后台刷新
+    assert cache.get("langchain 天气") == "result 1"
+    deadline = time.time() + 2
+    while len(calls) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.get_stats()["stale"] == 1
+    assert len(calls) == 2
+    # 后台刷新使用原始问题，而不是归一化后的缓存键
+    assert calls[1] == "LangChain 天气？"
@@ -0,0 +1,67 @@
+from langchain_core.messages import HumanMessage, AIMessage
+from src.Memory import SessionCache
+
+
+def test_session_cache():
+    cache = SessionCache(maxsize=2, ttl=60, window=3)
+    cache.put("a", None, [HumanMessage(content=str(i)) for i in range(5)])
+    summary, messages = cache.get("a")
+    assert summary is None
+    assert [m.content for m in messages] == ["2", "3", "4"]
+
+    # 写入时更新窗口，只保留最近 window 条
+    cache.append("a", AIMessage(content="5"))
+    assert [m.content for m in cache.get("a")[1]] == ["3", "4", "5"]
+
+    # 超出容量时淘汰最久未使用的会话
+    cache.put("b", "摘要", [])
+    cache.get("a")
+    cache.put("c", None, [])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+
+def test_stale_read_is_not_cached():
+    cache = SessionCache(maxsize=2, ttl=60, window=3)
+    # 读取 Redis 期间有新消息写入，读到的旧窗口不能写回缓存
+    version = cache.version()
+    cache.append("a", AIMessage(content="new"))
+    cache.put("a", None, [HumanMessage(content="old")], version)
+    assert cache.get("a") is None
+
+    version = cache.version()
+    cache.put("a", None, [HumanMessage(content="old"), AIMessage(content="new")], version)
+    assert [m.content for m in cache.get("a")[1]] == ["old", "new"]
+
+    # 读取期间会话被失效
+    version = cache.version()
+    cache.invalidate("a")
+    cache.put("a", None, [], version)
+    assert cache.get("a") is None
+
+
+def test_read_interleaved_with_write():
+    cache = SessionCache(maxsize=2, ttl=60, window=3)
+    cache.put("a", None, [HumanMessage(content="1")])
+    # 读取方先取版本号，写入方写 Redis 后读取方才 LRANGE，读到的窗口已包含新消息
+    read_version = cache.version()
+    write_version = cache.version()
+    cache.put("a", None, [HumanMessage(content="1"), AIMessage(content="2")], read_version)
+    cache.append("a", AIMessage(content="2"), write_version)
+    # 窗口不能出现重复消息：缓存失效，下次读取重新加载
+    assert cache.get("a") is None
+
+    # 没有并发读取时照常追加到缓存窗口
+    cache.put("a", None, [HumanMessage(content="1")], cache.version())
+    write_version = cache.version()
+    cache.append("a", AIMessage(content="2"), write_version)
+    assert [m.content for m in cache.get("a")[1]] == ["1", "2"]
+
+
+if __name__ == "__main__":
+    test_session_cache()
+    test_stale_read_is_not_cached()
+    test_read_interleaved_with_write()
@@ -0,0 +1,38 @@
+import random
+from src.Slots import busy_intervals, free_slots, merge_intervals, merge_intervals_vectorized
+from src.Matcher import parse_time
+
+HOUR = 3600
+
+
+def test_merge_matches_vectorized():
+    random.seed(7)
+    intervals = []
+    for _ in range(2000):
+        start = random.uniform(0, 100000)
+        intervals.append((start, start + random.uniform(0, 3000)))
+    assert merge_intervals(intervals) == merge_intervals_vectorized(intervals)
+    assert merge_intervals([(0, 10), (10, 20), (30, 40)]) == [(0, 20), (30, 40)]
+
+
+def test_free_slots():
+    availability = {"scheduleInformation": [
+        {"userId": "a", "scheduleItems": [
+            {"status": "BUSY", "start": {"dateTime": "2024-06-03T09:00:00+08:00"}, "end": {"dateTime": "2024-06-03T10:00:00+08:00"}},
+            {"status": "FREE", "start": {"dateTime": "2024-06-03T10:00:00+08:00"}, "end": {"dateTime": "2024-06-03T12:00:00+08:00"}},
+        ]},
+        {"userId": "b", "scheduleItems": [
+            {"status": "BUSY", "start": {"dateTime": "2024-06-03T10:20:00+08:00"}, "end": {"dateTime": "2024-06-03T11:00:00+08:00"}},
+        ]},
+    ]}
+    window_start = parse_time({"dateTime": "2024-06-03T09:00:00+08:00"})
+    window_end = parse_time({"dateTime": "2024-06-03T13:00:00+08:00"})
+    intervals = busy_intervals(availability)
+    assert len(intervals) == 2
+
+    slots = free_slots(intervals, window_start, window_end, 30 * 60, limit=3)
+    # 10:00-10:20 不够 30 分钟，最早的共同空闲从 11:00 开始
+    assert slots == [(window_start + 2 * HOUR, window_end)]
+
+    slots = free_slots(intervals, window_start, window_end, 15 * 60, limit=1)
+    assert slots == [(window_start + HOUR, window_start + HOUR + 20 * 60)]
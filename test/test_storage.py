@@ -0,0 +1,86 @@
+import json
+import pytest
+from src.Storage import InMemoryUserStore, RedisUserStore, UserRecord, UserStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode("utf-8") if isinstance(value, str) else value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, *args, **kwargs):
+        self.ops.append(("set", args, kwargs))
+
+    def delete(self, *args):
+        self.ops.append(("delete", args, {}))
+
+    def execute(self):
+        for name, args, kwargs in self.ops:
+            getattr(self.redis, name)(*args, **kwargs)
+
+
+def test_user_store_is_abstract():
+    with pytest.raises(TypeError):
+        UserStore()
+
+
+def test_in_memory_user_store():
+    store = InMemoryUserStore()
+    store.put_many([
+        UserRecord("union1", staff_id="staff1", nick="小明"),
+        UserRecord("union2", staff_id="staff2"),
+    ])
+    assert [r.user_id if r else None for r in store.get_many(["union2", "missing", "union1"])] == ["union2", None, "union1"]
+    assert store.get_by_staff_id("staff1").nick == "小明"
+
+    store.delete("union1")
+    assert store.get_by_staff_id("staff1") is None
+
+
+def test_in_memory_user_store_ttl():
+    clock = FakeClock()
+    store = InMemoryUserStore(clock=clock)
+    store.put(UserRecord("union1", staff_id="staff1"), ttl=1)
+    assert store.get("union1") is not None
+    clock.now += 1.1
+    assert store.get("union1") is None
+    assert store.get_by_staff_id("staff1") is None
+
+
+def test_redis_user_store_staff_id_change():
+    redis = FakeRedis()
+    store = RedisUserStore(redis_client=redis)
+    store.put(UserRecord("union1", staff_id="old"))
+    store.put(UserRecord("union1", staff_id="new"))
+    assert store.get_by_staff_id("old") is None
+    assert store.get_by_staff_id("new").user_id == "union1"
+    assert json.loads(redis.data["user:union1"])["staff_id"] == "new"
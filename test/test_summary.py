@@ -0,0 +1,179 @@
+import threading
+import time
+from langchain_core.messages import AIMessage, HumanMessage
+import src.Memory as Memory
+from src.Codec import encode_message
+from src.Memory import MemoryClass, RedisChatMessageHistory
+
+
+def _message(content, tokens):
+    message = HumanMessage(content=content)
+    message.response_metadata["token_count"] = tokens
+    return message
+
+
+class FakeSummaryChain:
+    """记录交给 LLM 的待总结内容；during 用来模拟总结期间其他请求对会话的写入"""
+    def __init__(self, during=None):
+        self.inputs = []
+        self.during = during
+
+    def __call__(self, store_message):
+        self.inputs.append(store_message)
+        if self.during is not None:
+            self.during()
+        return AIMessage(content=f"摘要{len(self.inputs)}")
+
+
+def _memory(chain):
+    memory = MemoryClass.__new__(MemoryClass)
+    memory.summary_chain = chain
+    return memory
+
+
+def _window_tokens(history):
+    return sum(Memory.message_tokens(message) for message in history.window_messages)
+
+
+def _fill(history, count, tokens=100, start=0):
+    for i in range(start, start + count):
+        history.add_message(_message(str(i), tokens))
+
+
+def test_summarize_folds_overflow(memory_redis, monkeypatch):
+    monkeypatch.setattr(Memory, "SUMMARY_TRIGGER_TOKENS", 250)
+    monkeypatch.setattr(Memory, "MEMORY_WINDOW_TOKENS", 150)
+    history = RedisChatMessageHistory("user1")
+    chain = FakeSummaryChain()
+    memory = _memory(chain)
+
+    _fill(history, 2)
+    # 未超过阈值时不总结
+    assert not memory.summarize(history)
+    assert chain.inputs == []
+
+    _fill(history, 3, start=2)
+    assert history.token_total == 500
+    assert memory.summarize(history)
+    # 最旧的四条折叠进摘要，只保留窗口内的一条原文
+    assert chain.inputs[0].splitlines() == [f"HumanMessage: {i}" for i in range(4)]
+    assert [m.content for m in history.window_messages] == ["4"]
+    assert history.summary == "摘要1"
+    assert history.token_total == _window_tokens(history) == 100
+    assert memory_redis.ttl(history.summary_key) > 0
+    assert memory_redis.ttl(history.tokens_key) > 0
+
+    # 再次总结时把已有摘要和新增的溢出消息合并
+    _fill(history, 3, start=5)
+    assert memory.summarize(history)
+    assert chain.inputs[1].startswith("已有摘要: 摘要1")
+    assert "HumanMessage: 4" in chain.inputs[1] and "HumanMessage: 7" not in chain.inputs[1]
+    assert [m.content for m in history.window_messages] == ["7"]
+    assert history.token_total == _window_tokens(history) == 100
+    # 读取到的历史以摘要开头
+    assert history.messages[0].content == "之前对话的摘要：摘要2"
+
+
+def test_fold_keeps_messages_added_during_summary(memory_redis, monkeypatch):
+    monkeypatch.setattr(Memory, "SUMMARY_TRIGGER_TOKENS", 250)
+    monkeypatch.setattr(Memory, "MEMORY_WINDOW_TOKENS", 150)
+    history = RedisChatMessageHistory("user1")
+    _fill(history, 5)
+    memory = _memory(FakeSummaryChain(during=lambda: _fill(history, 2, tokens=30, start=5)))
+
+    assert memory.summarize(history)
+    assert [m.content for m in history.window_messages] == ["4", "5", "6"]
+    assert history.token_total == _window_tokens(history) == 160
+
+
+def test_fold_aborts_when_history_rewritten(memory_redis, monkeypatch):
+    monkeypatch.setattr(Memory, "SUMMARY_TRIGGER_TOKENS", 250)
+    monkeypatch.setattr(Memory, "MEMORY_WINDOW_TOKENS", 150)
+    history = RedisChatMessageHistory("user1")
+    _fill(history, 5)
+
+    def rewrite():
+        history.clear()
+        _fill(history, 1, tokens=40, start=9)
+
+    memory = _memory(FakeSummaryChain(during=rewrite))
+    assert not memory.summarize(history)
+    assert history.summary is None
+    assert [m.content for m in history.window_messages] == ["9"]
+    assert history.token_total == 40
+
+
+def test_init_token_total_backfills_legacy_messages(memory_redis, monkeypatch):
+    # 按字符计数，测试不依赖下载 tiktoken 的词表
+    monkeypatch.setattr(Memory, "count_tokens", len)
+    history = RedisChatMessageHistory("user1")
+    # 旧会话：消息里没有 token 数，也没有计数键
+    memory_redis.lpush(history.key, *[encode_message(HumanMessage(content=f"旧消息{i}")) for i in range(3)])
+    assert history.token_total is None
+
+    # 第一次读取窗口后插入一条新消息，WATCH 失败后应重新计算
+    decode = Memory.decode_messages
+    calls = []
+
+    def decode_with_append(items):
+        if not calls:
+            history.add_message(_message("新消息", 7))
+        calls.append(len(items))
+        return decode(items)
+
+    monkeypatch.setattr(Memory, "decode_messages", decode_with_append)
+    total = history.init_token_total()
+    monkeypatch.setattr(Memory, "decode_messages", decode)
+
+    assert calls[-1] == 4
+    assert total == history.token_total == _window_tokens(history)
+    assert all(m.response_metadata.get("token_count") is not None for m in history.window_messages)
+    assert [m.content for m in history.window_messages][-1] == "新消息"
+    assert memory_redis.ttl(history.key) > 0 and memory_redis.ttl(history.tokens_key) > 0
+
+
+class CountingMemory:
+    def __init__(self, started=None, release=None):
+        self.calls = 0
+        self.started = started
+        self.release = release
+
+    def summarize(self, history):
+        self.calls += 1
+        if self.started is not None:
+            self.started.set()
+            self.release.wait(5)
+        return True
+
+
+def test_run_summary_skips_while_locked(memory_redis):
+    memory = CountingMemory()
+    lock = memory_redis.lock("summary_lock:user1", timeout=60)
+    assert lock.acquire(blocking=False)
+
+    # 另一个进程持有会话锁时直接放弃，并释放本进程的排队标记
+    Memory._run_summary(memory, "user1")
+    assert memory.calls == 0
+    assert "user1" not in Memory._pending_sessions
+
+    lock.release()
+    Memory._run_summary(memory, "user1")
+    assert memory.calls == 1
+    assert not memory_redis.exists("summary_lock:user1")
+
+
+def test_schedule_summary_once_per_session(memory_redis):
+    started, release = threading.Event(), threading.Event()
+    memory = CountingMemory(started, release)
+
+    assert Memory.schedule_summary(memory, "user1")
+    assert started.wait(5)
+    # 任务执行期间重复提交被忽略
+    assert not Memory.schedule_summary(memory, "user1")
+    release.set()
+    for _ in range(100):
+        if "user1" not in Memory._pending_sessions:
+            break
+        time.sleep(0.01)
+    assert memory.calls == 1
+    assert "user1" not in Memory._pending_sessions
@@ -0,0 +1,95 @@
+import threading
+import time
+import pytest
+import src.DingTalk as DingTalk
+from src.DingTalk import DingTalkClient, TokenManager
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self.data = data or {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    """模拟钉钉令牌接口和业务接口，记录调用次数"""
+    def __init__(self, statuses=(), delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.token_calls = 0
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def post(self, url, **kwargs):
+        # 放慢令牌接口，让并发线程都在刷新期间到达
+        time.sleep(self.delay)
+        with self._lock:
+            self.token_calls += 1
+            count = self.token_calls
+        return FakeResponse(200, {"accessToken": f"token-{count}", "expireIn": 7200})
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.requests.append(headers["x-acs-dingtalk-access-token"])
+        return FakeResponse(self.statuses.pop(0) if self.statuses else 200)
+
+
+def test_concurrent_get_token_fetches_once(monkeypatch):
+    session = FakeSession(delay=0.05)
+    monkeypatch.setattr(DingTalk, "http_session", session)
+    manager = TokenManager("key", "secret")
+    barrier = threading.Barrier(16)
+    tokens = []
+
+    def worker():
+        barrier.wait()
+        tokens.append(manager.get_token())
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert session.token_calls == 1
+    assert tokens == ["token-1"] * 16
+
+
+def test_unauthorized_refreshes_and_retries_once(monkeypatch):
+    session = FakeSession(statuses=[401, 200])
+    monkeypatch.setattr(DingTalk, "http_session", session)
+    monkeypatch.setattr(DingTalk, "_token_managers", {})
+    monkeypatch.setenv("DINGDING_ID", "key")
+    monkeypatch.setenv("DINGDING_SECRET", "secret")
+    monkeypatch.setenv("DINGDING_UNION_ID", "union")
+
+    response = DingTalkClient().request("GET", "/v1.0/calendar/users/union/calendars")
+
+    assert response.status_code == 200
+    # 首次取令牌一次，401 之后刷新一次；旧令牌和新令牌各请求一次
+    assert session.token_calls == 2
+    assert session.requests == ["token-1", "token-2"]
+
+
+def test_repeated_unauthorized_does_not_loop(monkeypatch):
+    session = FakeSession(statuses=[401, 401, 200])
+    monkeypatch.setattr(DingTalk, "http_session", session)
+    monkeypatch.setattr(DingTalk, "_token_managers", {})
+    monkeypatch.setenv("DINGDING_ID", "key")
+    monkeypatch.setenv("DINGDING_SECRET", "secret")
+    monkeypatch.setenv("DINGDING_UNION_ID", "union")
+
+    with pytest.raises(RuntimeError):
+        DingTalkClient().request("GET", "/v1.0/calendar/users/union/calendars")
+    assert session.token_calls == 2
+    assert len(session.requests) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
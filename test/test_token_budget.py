@@ -0,0 +1,48 @@
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from src.Memory import trim_messages_to_budget, trim_scratchpad
+from src.Prompt import get_prompt
+
+
+def _message(cls, content, tokens, **kwargs):
+    message = cls(content=content, **kwargs)
+    message.response_metadata["token_count"] = tokens
+    return message
+
+
+def test_trim_messages_to_budget():
+    messages = [_message(HumanMessage, str(i), 100) for i in range(5)]
+    kept = trim_messages_to_budget(messages, 250)
+    assert [m.content for m in kept] == ["3", "4"]
+    assert trim_messages_to_budget(messages, 50) == []
+
+
+def test_trim_scratchpad():
+    steps = [
+        _message(AIMessage, "call1", 50),
+        _message(ToolMessage, "result1", 200, tool_call_id="1"),
+        _message(AIMessage, "call2", 50),
+        _message(ToolMessage, "result2", 100, tool_call_id="2"),
+    ]
+    # 工具调用和结果成对保留
+    assert [m.content for m in trim_scratchpad(steps, 200)] == ["call2", "result2"]
+    # 最新一组超出预算时仍然保留
+    assert [m.content for m in trim_scratchpad(steps, 100)] == ["call2", "result2"]
+
+
+def test_prompt_trims_scratchpad():
+    steps = [
+        _message(AIMessage, "call1", 1500),
+        _message(ToolMessage, "result1", 1500, tool_call_id="1"),
+        _message(AIMessage, "call2", 50),
+        _message(ToolMessage, "result2", 100, tool_call_id="2"),
+    ]
+    messages = get_prompt().format_messages(input="你好", chat_history=[], agent_scratchpad=steps)
+    contents = [m.content for m in messages]
+    assert "call1" not in contents
+    assert contents[-2:] == ["call2", "result2"]
+
+
+if __name__ == "__main__":
+    test_trim_messages_to_budget()
+    test_trim_scratchpad()
+    test_prompt_trims_scratchpad()